@@ -2,7 +2,6 @@
 
 def run_simulation(tramline_nodes, num_agents):
     import json
-    import subprocess
 
     # Load current config
     with open("transport_sim/config.json") as f:
@@ -16,5 +15,6 @@ def run_simulation(tramline_nodes, num_agents):
     with open("transport_sim/config.json", "w") as f:
         json.dump(config, f, indent=2)
 
-    # Call the simulation script
-    subprocess.run(["python", "transport_sim/run_sim.py"], check=True)
+    # Run in-process so the city graph stays loaded for the next call
+    from transport_sim.engine import simulate
+    return simulate(config)
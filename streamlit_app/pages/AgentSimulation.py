@@ -2,14 +2,20 @@
 import os
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 import sys
-import json
 from datetime import datetime
 import streamlit as st
-import subprocess
 
 # Adjust path for imports from streamlit_app/
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
-from streamlit_app.utils import get_stops_for_city
+from streamlit_app.utils import get_stops_for_city, get_hub_for_city
+from transport_sim.engine import get_engine
+
+
+@st.cache_resource
+def get_simulation_engine():
+    # One warm engine per Streamlit server: city graphs stay loaded between runs
+    return get_engine()
+
 
 # Page config
 st.set_page_config(page_title="Agent Simulation Config", page_icon="🛠️")
@@ -64,6 +70,9 @@ sim_time = st.time_input("Time", value=datetime.strptime("08:00", "%H:%M").time(
 
 selected_traffic_level = st.selectbox("Traffic Level", ["off-peak", "rush hour"])
 
+store_routes = st.checkbox("💾 Keep every agent's route with this run", value=False,
+                           help="Routes make saved runs much larger; stats and distances are always kept.")
+
 # --- 3. Save & Run ---
 if st.button("🚀 Save & Run Simulation"):
 
@@ -71,7 +80,7 @@ if st.button("🚀 Save & Run Simulation"):
         "city": selected_city,
         "tramline": [tram_start, tram_end],
         "num_agents": num_agents,
-        "hub": "Bournemouth Station",
+        "hub": get_hub_for_city(selected_city),
         "agent_distribution": {
             "drive": drive_pct,
             "cycle": cycle_pct,
@@ -79,6 +88,7 @@ if st.button("🚀 Save & Run Simulation"):
         },
         "sim_date": sim_date.isoformat(),
         "sim_time": sim_time.strftime("%H:%M"),
+        "store_routes": store_routes,
         "scenarios": {
             "baseline": {},
             "tramline_extension": {
@@ -89,25 +99,15 @@ if st.button("🚀 Save & Run Simulation"):
     }
     resultOk = True
     error_msgs = []
+    traffic_levels = ["off-peak", "peak"]
 
-    for traffic in ["off-peak", "peak"]:
-        config = base_config.copy()
-        config["traffic"] = traffic
-        config_path = os.path.abspath(
-            os.path.join(os.path.dirname(__file__), "..", "..", f"transport_sim/config_{traffic}.json")
-        )
-        with open(config_path, "w") as f:
-            json.dump(config, f, indent=2)
-
-        with st.spinner(f"Running simulation for {traffic}..."):
-            run_path = os.path.abspath(
-                os.path.join(os.path.dirname(__file__), "..", "..", "transport_sim", "run_sim.py")
-            )
-            result = subprocess.run(["python3", run_path, config_path], capture_output=True, text=True)
-
-        if result.returncode != 0:
+    # Both traffic levels in one pass: one graph load, geocode and agent draw
+    with st.spinner(f"Running simulation for {' and '.join(traffic_levels)}..."):
+        try:
+            get_simulation_engine().simulate_matrix(base_config, traffic=traffic_levels)
+        except Exception as e:
             resultOk = False
-            error_msgs.append(f"❌ {traffic} failed:\n{result.stderr.strip()}")
+            error_msgs.append(f"❌ Simulation failed:\n{e}")
 
     if resultOk:
         st.success("✅ Simulation complete. Please check the Results tab.")
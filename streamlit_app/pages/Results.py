@@ -2,11 +2,13 @@ import os
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 import sys
 import streamlit as st
-from streamlit_app.utils import load_stats, load_html
+from streamlit_app.utils import load_stats
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
+import pydeck as pdk
 from transport_sim.simulation import load_config
+from transport_sim.run_store import RunStore, compare_runs
 
 config = load_config()
 AGENTS_USED = config['num_agents']
@@ -31,7 +33,7 @@ st.title("📊 Simulation Results")
 # Check if result files exist
 base_path = "transport_sim/results"
 stat_file = os.path.join(base_path, "tramline_stats.json")
-map_file = os.path.join(base_path, "tramline_access_colored.html")
+map_file = os.path.join(base_path, "tramline_access_colored.geojson")
 
 if not os.path.exists(stat_file) or not os.path.exists(map_file):
     st.warning("No simulation results found. Please run an Agent-Based Simulation first.")
@@ -144,10 +146,28 @@ st.dataframe(styled_summary, use_container_width=True)
 
 
 
-# Load and display map
+# Load and display map: hexagon bins as GeoJSON, so its size does not grow with the agent count
 st.markdown("### Accessibility Map (with Tramline Overlay)")
-map_html = load_html(map_file)
-st.components.v1.html(map_html, height=600, scrolling=True)
+st.caption("Agent home nodes binned into hexagons, coloured by mean distance to the hub (green is closest).")
+features = load_stats(map_file)["features"]
+# Hexagon cells, plus the run's own tramline as a LineString feature
+cells = {"type": "FeatureCollection", "features": [f for f in features if f["geometry"]["type"] == "Polygon"]}
+lines = [f for f in features if f["geometry"]["type"] == "LineString"]
+centres = np.array([f["geometry"]["coordinates"][0][0] for f in cells["features"]]) if cells["features"] else np.array([[-1.88, 50.72]])
+layers = [pdk.Layer(
+    "GeoJsonLayer", cells, get_fill_color="properties.rgb", opacity=0.6,
+    stroked=False, filled=True, pickable=True
+)]
+if lines:
+    layers.append(pdk.Layer(
+        "PathLayer", [{"path": f["geometry"]["coordinates"]} for f in lines],
+        get_path="path", get_color=[255, 0, 0], width_min_pixels=4
+    ))
+st.pydeck_chart(pdk.Deck(
+    layers=layers,
+    initial_view_state=pdk.ViewState(latitude=float(centres[:, 1].mean()), longitude=float(centres[:, 0].mean()), zoom=12),
+    tooltip={"text": "{properties.count} homes\nMean: {properties.mean} m\nBest: {properties.min} m"},
+))
 
 st.info("Results shown are from the most recent simulation.")
 
@@ -176,6 +196,42 @@ df_detailed = pd.DataFrame(rows_detailed)
 st.markdown("### 📊 Full Travel Stats by Mode")
 st.dataframe(df_detailed.set_index("Mode").T, use_container_width=True)
 
+# -------------------------
+# PART 3: Compare Saved Runs
+# -------------------------
+store = RunStore(os.path.join(base_path, "runs"))
+runs = store.runs()
+if len(runs) >= 2:
+    def run_label(run):
+        c = run["config"]
+        line = " → ".join(map(str, c.get("tramline") or []))
+        return f"{run['run_id']} · {c.get('city')} · {c.get('traffic', 'off-peak')} · {line} · {c.get('num_agents')} agents"
+
+    # Newest first; only the mode, status and distance columns are read back
+    labels = {run_label(run): run["run_id"] for run in reversed(runs)}
+    col1, col2, col3 = st.columns(3)
+    run_a = col1.selectbox("Run A", list(labels), index=1)
+    run_b = col2.selectbox("Run B", list(labels), index=0)
+    population = col3.radio("Population", ["tramline", "baseline"])
+    comparison = compare_runs(store, labels[run_a], labels[run_b], population)
+
+    rows_runs = []
+    for mode, m in comparison["modes"].items():
+        rows_runs.append({
+            "Mode": mode.title(),
+            "Run A Avg (m)": safe(m["a"].get("avg_distance")),
+            "Run B Avg (m)": safe(m["b"].get("avg_distance")),
+            "Δ Avg (m)": safe(m["delta_avg_distance"]),
+            "Unreachable (A)": m["a"].get("unreachable", 0),
+            "Unreachable (B)": m["b"].get("unreachable", 0),
+        })
+
+    st.markdown("### 🗂️ Compare Saved Runs")
+    df_runs = pd.DataFrame(rows_runs).set_index("Mode")
+    st.dataframe(df_runs.style.map(highlight_delta, subset=["Δ Avg (m)"]), use_container_width=True)
+    if "changed_agents" in comparison:
+        st.caption(f"🔁 {comparison['changed_agents']} agents differ between the two runs (same agents in both).")
+
 # Load both result files
 try:
     peak_stats = load_stats("transport_sim/results/tramline_stats_peak.json")
@@ -15,9 +15,19 @@ tram_stops_by_city = {
     ]
 }
 
+# Hub each city's agents travel to; names the city's gazetteer knows offline
+hub_by_city = {
+    "Bournemouth": "Bournemouth Station",
+    "Poole": "Poole Station",
+    "Southampton": "Central Station",
+}
+
 def get_stops_for_city(city):
     return tram_stops_by_city.get(city, [])
 
+def get_hub_for_city(city):
+    return hub_by_city.get(city, "Bournemouth Station")
+
 
 def load_image(path):
     """Safely load an image file with fallback."""
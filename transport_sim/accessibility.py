@@ -0,0 +1,139 @@
+import os
+import json
+import numpy as np
+from transport_sim.movement import MODE_SPEEDS_KPH, edge_times
+from transport_sim.population import MODES
+from transport_sim.routing import ShortestPathTree, path_sum
+
+# Default isochrone band edges: metres for distance, seconds for time
+DISTANCE_BANDS = [500, 1000, 2000, 5000, 10000]
+TIME_BANDS = [300, 600, 900, 1800, 3600]
+
+# Routing cost per metre (distance) or per second (time) where cost is exactly
+# proportional along any path, so a cutoff can bound the search itself
+_COST_PER_UNIT = {
+    ("walk", "distance"): 1.0,
+    ("walk", "time"): MODE_SPEEDS_KPH["walk"] / 3.6,
+    ("cycle", "distance"): 1.1,
+    ("cycle", "time"): 1.1 * MODE_SPEEDS_KPH["cycle"] / 3.6,
+    ("drive", "time"): 1 / 3.6,
+}
+
+
+def _hub_tree(router, hub, mode, limit):
+    # The cached tree when there is one (or no cutoff), else a search bounded at ``limit``
+    if limit is None or router.has_tree(hub, mode):
+        return router.tree(hub, mode)
+    row = int(router.cg.index_of(hub))
+    dist, pred, edge = router.search([row], mode, to_sources=True, limit=limit)
+    return ShortestPathTree(router.cg, hub, dist[0], pred[0], edge[0], node_rows=router.node_rows(mode))
+
+
+def mode_surface(router, hub, mode, metric="distance", cutoff=None):
+    """
+    Distance (metres) or travel time (seconds) from every node to ``hub`` by one mode.
+
+    Values follow each node's least-cost route, as agents do; inf marks
+    nodes that cannot reach the hub or lie beyond ``cutoff`` (in the same
+    unit as ``metric``).
+    """
+    if metric not in ("distance", "time"):
+        raise ValueError(f"Unknown metric: {metric}")
+    scale = _COST_PER_UNIT.get((mode, metric))
+    limit = None if cutoff is None or scale is None else np.nextafter(cutoff * scale, np.inf)
+    tree = _hub_tree(router, hub, mode, limit)
+
+    if metric == "distance":
+        values = tree.length.copy()
+    else:
+        per_edge = edge_times(router)[MODES.index(mode)]
+        values = path_sum(tree.pred, np.where(tree.edge >= 0, per_edge[np.maximum(tree.edge, 0)], 0.0))
+    values[~np.isfinite(tree.dist)] = np.inf
+    # Multimodal trees also hold on-board rows; trips start on foot
+    values = values[:router.cg.n_nodes]
+    if cutoff is not None:
+        values[values > cutoff] = np.inf
+    return values
+
+
+def accessibility_surface(router, hub, modes=None, metric="distance", cutoff=None):
+    """
+    {mode: value per node row} for every mode, from one tree per mode.
+
+    Tram values are walk-tram-walk trips, as agents take them.
+    """
+    return {mode: mode_surface(router, hub, mode, metric, cutoff) for mode in modes or MODES}
+
+
+def isochrone_bands(values, bands):
+    """
+    Band index per node: 0 within ``bands[0]``, i within ``bands[i]``, and
+    len(bands) beyond the last band or unreachable.
+    """
+    return np.searchsorted(np.asarray(bands, dtype=np.float64), values, side="left")
+
+
+def surface_delta(baseline, scenario):
+    """
+    Per-node improvement (baseline minus scenario) for every mode.
+
+    +inf: newly reachable, -inf: no longer reachable, NaN: unreachable in both.
+    """
+    with np.errstate(invalid="ignore"):
+        return {mode: baseline[mode] - scenario[mode] for mode in baseline if mode in scenario}
+
+
+def band_counts(surface, bands):
+    """{mode: nodes per band}, the last entry counting nodes beyond every band."""
+    return {
+        mode: np.bincount(isochrone_bands(values, bands), minlength=len(bands) + 1).tolist()
+        for mode, values in surface.items()
+    }
+
+
+def summarize_surfaces(baseline, scenario, bands, cutoff=None):
+    """
+    Band counts for both surfaces plus per-mode counts of improved, worse and newly reachable nodes.
+
+    Surfaces cut at ``cutoff`` mark nodes beyond it as inf, so a node cannot
+    be told apart from an unreachable one: with a cutoff the counts of nodes
+    moving across it are reported as ``entered_cutoff`` and ``left_cutoff``
+    instead of ``newly_reachable`` and ``lost``. ``improved`` and ``worse``
+    only count nodes within reach (and the cutoff) in both surfaces.
+    """
+    gained, lost = ("newly_reachable", "lost") if cutoff is None else ("entered_cutoff", "left_cutoff")
+    delta = surface_delta(baseline, scenario)
+    changes = {}
+    for mode, d in delta.items():
+        finite = np.isfinite(d)
+        changes[mode] = {
+            "improved": int((d[finite] > 1e-9).sum()),
+            "worse": int((d[finite] < -1e-9).sum()),
+            gained: int((d == np.inf).sum()),
+            lost: int((d == -np.inf).sum()),
+            "mean_gain": float(d[finite].mean()) if finite.any() else None,
+        }
+    return {
+        "bands": list(bands),
+        "baseline": band_counts(baseline, bands),
+        "tramline": band_counts(scenario, bands),
+        "changes": changes,
+    }
+
+
+def save_surfaces(path, cg, surfaces, summary=None):
+    """
+    Write surfaces as one .npz: node ids, lon/lat and a
+    ``<name>_<mode>`` array per surface (e.g. baseline_walk), plus an
+    optional JSON summary next to it.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    arrays = {"node_ids": np.asarray(cg.node_ids), "x": np.asarray(cg.x), "y": np.asarray(cg.y)}
+    for name, surface in surfaces.items():
+        for mode, values in surface.items():
+            arrays[f"{name}_{mode}"] = values.astype(np.float32)
+    np.savez_compressed(path, **arrays)
+    if summary is not None:
+        with open(os.path.splitext(path)[0] + ".json", "w") as f:
+            json.dump(summary, f, indent=2)
+    return path
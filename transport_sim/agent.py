@@ -1,5 +1,24 @@
 import networkx as nx
 import random
+from transport_sim.landmarks import point_to_point
+from transport_sim.movement import traversal_time
+from transport_sim.routing import RoutingEngine, MULTIMODAL_MODES
+
+
+def graph_router(graph):
+    """
+    A RoutingEngine for a NetworkX graph, built once and kept in ``G.graph``.
+
+    ``G.copy()`` shares it, so it is rebuilt when the copy's node or edge
+    count differs (e.g. after apply_scenario adds a tramline); changing edge
+    attributes in place is not detected.
+    """
+    key = (graph.number_of_nodes(), graph.number_of_edges())
+    cached = graph.graph.get("router")
+    if cached is None or cached[0] != key:
+        cached = graph.graph["router"] = (key, RoutingEngine(graph))
+    return cached[1]
+
 
 class Agent:
     def __init__(self, id, home_node, graph, hub_node, mode='walk'):
@@ -11,6 +30,9 @@ class Agent:
         self.route = []
         self.total_distance = 0
         self.status = 'active'
+        # Movement along the route: index of the current node and seconds travelled
+        self.position = 0
+        self.clock = 0.0
 
     def get_weight(self, u, v, data):
         length = data.get("length", 1)
@@ -25,30 +47,90 @@ class Agent:
             speed = data.get("speed_kph", 30)
             return length / speed  # simulate time-based cost
         elif self.mode == "tram":
-            return 0.1 if data.get("tram") else float("inf")
+            # Ride tram edges, walk the rest (stop penalties need the layered graph)
+            return traversal_time("tram" if data.get("tram") else "walk", length)
 
         return length  # fallback
 
-    def plan_route(self):
+    def edge_cost(self, u, v, data):
+        # NetworkX passes the dict of parallel edges for MultiGraphs
+        if self.graph.is_multigraph():
+            cost = min(self.get_weight(u, v, d) for d in data.values())
+        else:
+            cost = self.get_weight(u, v, data)
+        return None if cost == float("inf") else cost  # None hides the edge
+
+    def edge_data(self, u, v):
+        data = self.graph.get_edge_data(u, v)
+        if self.graph.is_multigraph():
+            data = min(data.values(), key=lambda d: self.get_weight(u, v, d))
+        return data
+
+    def edge_length(self, u, v):
+        return self.edge_data(u, v).get("length", 1)
+
+    def plan_route(self, router=None):
+        self.position = 0
+        if router is None and self.mode in MULTIMODAL_MODES:
+            # Walk-tram-walk trips need the layered graph, i.e. a router;
+            # agents on one graph share it and its tree from the hub
+            router = graph_router(self.graph)
+        if router is not None:
+            if router.has_tree(self.hub_node, self.mode):
+                return self.plan_route_from_tree(router)
+            return self.plan_route_point_to_point(router)
         try:
-            self.route = nx.shortest_path(self.graph, self.home_node, self.hub_node, weight='length')
-            self.total_distance = nx.shortest_path_length(self.graph, self.home_node, self.hub_node, weight='length')
-        except:
-            if self.mode == "tram":
-                # Fallback to walk
-                self.mode = "walk"
-                self.plan_route()
-            else:
-                self.status = 'unreachable'
-                self.route = []
+            self.route = nx.shortest_path(self.graph, self.home_node, self.hub_node, weight=self.edge_cost)
+            self.total_distance = sum(
+                self.edge_length(u, v) for u, v in zip(self.route, self.route[1:])
+            )
+        except (nx.NetworkXNoPath, nx.NodeNotFound):
+            self.status = 'unreachable'
+            self.route = []
+
+    def plan_route_from_tree(self, router):
+        """Read this agent's route off the router's shared tree from the hub."""
+        tree = router.tree(self.hub_node, self.mode)
+        if tree.is_reachable(self.home_node):
+            self.route = tree.route(self.home_node)
+            self.total_distance = float(tree.distance(self.home_node))
+        else:
+            self.status = 'unreachable'
+            self.route = []
+
+    def plan_route_point_to_point(self, router):
+        """Route this agent alone with the router's landmark A* (no shared tree needed)."""
+        route, distance = point_to_point(router, self.home_node, self.hub_node, self.mode)
+        if route:
+            self.route = route
+            self.total_distance = distance
+        else:
+            self.status = 'unreachable'
+            self.route = []
 
     def switch_mode(self, new_mode):
         self.mode = new_mode
         self.plan_route()
 
+    @property
+    def location(self):
+        return self.route[self.position] if self.route else self.home_node
+
     def step(self):
-        # Not implemented: placeholder for future simulation steps
-        pass
+        """
+        Move one edge along the route at the mode's speed.
+
+        Returns False once the agent is at the end of its route. Whole
+        populations move with movement.MovementEngine instead.
+        """
+        if self.status != 'active' or self.position >= len(self.route) - 1:
+            return False
+        u, v = self.route[self.position], self.route[self.position + 1]
+        data = self.edge_data(u, v)
+        mode = "walk" if self.mode == "tram" and not data.get("tram") else self.mode
+        self.clock += traversal_time(mode, data.get("length", 1), data.get("speed_kph"))
+        self.position += 1
+        return True
 
     def to_dict(self):
         return {
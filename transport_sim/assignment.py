@@ -0,0 +1,131 @@
+import numpy as np
+from transport_sim.edge_usage import mode_edge_flows
+from transport_sim.routing import RoutingEngine
+
+# Hourly capacity per direction by road class (vehicles); other classes get the default
+CAPACITY_VPH = {
+    "motorway": 4000, "motorway_link": 1500, "trunk": 3000, "trunk_link": 1500,
+    "primary": 1800, "primary_link": 1200, "secondary": 1200, "secondary_link": 900,
+    "tertiary": 900, "tertiary_link": 600, "unclassified": 600, "residential": 600,
+    "living_street": 300, "service": 300,
+}
+DEFAULT_CAPACITY_VPH = 600
+
+# BPR volume-delay: cost = free-flow cost * (1 + alpha * (flow / capacity) ** beta)
+BPR_ALPHA = 0.15
+BPR_BETA = 4
+
+
+def capacities(cg):
+    """Hourly capacity of every edge from its highway class."""
+    by_code = np.array([CAPACITY_VPH.get(name, DEFAULT_CAPACITY_VPH) for name in cg.highway_classes],
+                       dtype=np.float64)
+    return by_code[np.asarray(cg.highway)]
+
+
+def bpr(flows, capacity, alpha=BPR_ALPHA, beta=BPR_BETA):
+    """BPR delay factor for each edge."""
+    return 1 + alpha * (flows / capacity) ** beta
+
+
+class CongestedTraffic:
+    """
+    Drive cost multipliers from an assignment, used as RoutingEngine(traffic=...).
+
+    ``factors`` are per-edge BPR factors on top of an optional time-of-day
+    ``traffic``; edges added by a scenario overlay after the assignment
+    keep their uncongested cost.
+    """
+
+    def __init__(self, factors, traffic=None):
+        self.factors = factors
+        self.traffic = traffic
+
+    @property
+    def key(self):
+        return ("congested", id(self))
+
+    def multipliers(self, cg):
+        factors = np.ones(cg.n_edges)
+        factors[:len(self.factors)] = self.factors
+        if self.traffic is not None:
+            factors *= self.traffic.multipliers(cg)
+        return factors
+
+    def is_free_flow(self):
+        return False
+
+
+def all_or_nothing(router, agents, mode="drive"):
+    """Edge flows when every routable ``mode`` agent takes its least-cost route."""
+    return mode_edge_flows(router, agents, mode)
+
+
+def assign_traffic(router, agents, method="msa", max_iter=30, tol=1e-3, vehicles_per_agent=1.0,
+                   alpha=BPR_ALPHA, beta=BPR_BETA, destinations=None):
+    """
+    Iterative drive assignment with BPR congestion feedback.
+
+    ``agents`` is an AgentPopulation (routed or not) whose drive agents make
+    up the demand; each stands for ``vehicles_per_agent`` vehicles in the
+    hour, heading for ``destinations`` as in plan_routes. Every iteration routes all of them on the current congested costs
+    (all-or-nothing), then moves the flows towards that assignment: by 1/k
+    with ``method="msa"``, or by the step minimising the Beckmann objective
+    with ``method="fw"`` (Frank-Wolfe). Stops when the relative gap drops
+    below ``tol``.
+
+    Returns a dict with the congested ``router`` (free-flow router shared
+    for other modes), edge ``flows`` in vehicles, BPR ``factors`` and the
+    relative ``gaps`` per iteration.
+    """
+    if method not in ("msa", "fw"):
+        raise ValueError(f"Unknown assignment method: {method}")
+    agents = agents.copy()
+    agents.plan_routes(router, destinations=destinations)
+    cg = router.cg
+    capacity = capacities(cg)
+    base = router.weights("drive")
+    free_flow = router.free_flow or router
+
+    def congested(flows):
+        factors = bpr(flows, capacity, alpha, beta)
+        return RoutingEngine(cg, traffic=CongestedTraffic(factors, router.traffic), free_flow=free_flow), factors
+
+    flows = all_or_nothing(router, agents) * vehicles_per_agent
+    gaps = []
+    for k in range(2, max_iter + 1):
+        current, factors = congested(flows)
+        cost = np.where(np.isfinite(base), base * factors, 0.0)
+        target = all_or_nothing(current, agents) * vehicles_per_agent
+        # Relative gap: how much cheaper the current shortest paths are than the flows' routes
+        total = float(np.dot(flows, cost))
+        gap = (total - float(np.dot(target, cost))) / total if total > 0 else 0.0
+        gaps.append(gap)
+        if gap < tol:
+            break
+        direction = target - flows
+        if method == "msa":
+            step = 1.0 / k
+        else:
+            step = _line_search(flows, direction, base, capacity, alpha, beta)
+        flows = flows + step * direction
+
+    current, factors = congested(flows)
+    print(f"🚦 Traffic assignment ({method}): {len(gaps) + 1} iterations, relative gap {gaps[-1] if gaps else 0:.2e}")
+    return {"router": current, "flows": flows, "factors": factors, "gaps": gaps}
+
+
+def _line_search(flows, direction, base, capacity, alpha, beta, steps=30):
+    # Bisection on the Beckmann objective's derivative: sum(direction * cost(flows + step * direction)) = 0
+    ok = np.isfinite(base) & (direction != 0)
+    flows, direction, base, capacity = flows[ok], direction[ok], base[ok], capacity[ok]
+    lo, hi = 0.0, 1.0
+    if np.dot(direction, base * bpr(flows + direction, capacity, alpha, beta)) <= 0:
+        return 1.0
+    for _ in range(steps):
+        mid = (lo + hi) / 2
+        if np.dot(direction, base * bpr(flows + mid * direction, capacity, alpha, beta)) > 0:
+            hi = mid
+        else:
+            lo = mid
+    return (lo + hi) / 2
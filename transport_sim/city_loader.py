@@ -1,6 +1,12 @@
+import os
 import osmnx as ox
 import folium
 import numpy as np
+from transport_sim.graph_cache import CompiledGraph, compile_graph, save_compiled, load_compiled, attached_index
+from transport_sim.gazetteer import build_gazetteer
+from transport_sim.hexbin import MAX_BINS, hex_bins, value_colors, save_geojson
+from transport_sim.overlay import ScenarioOverlay
+from transport_sim.spatial_index import spatial_index, nearest_nodes
 
 tram_coords_lookup = {
     "Bournemouth Pier": (50.7167, -1.8760),
@@ -26,9 +32,9 @@ def add_tramline_to_map(m, start_name, end_name):
         folium.Marker(coords[0], tooltip="Start", icon=folium.Icon(color="green")).add_to(m)
         folium.Marker(coords[1], tooltip="End", icon=folium.Icon(color="blue")).add_to(m)
 
-def load_city(city_name="Bournemouth, UK"):
+def download_city(city_name="Bournemouth, UK", network_type="walk"):
     # Step 1: Download and simplify graph
-    G = ox.graph_from_place(city_name, network_type="walk", simplify=True)
+    G = ox.graph_from_place(city_name, network_type=network_type, simplify=True)
 
     # Step 2: Project it to ensure lat/lon are assigned properly
     G_proj = ox.project_graph(G, to_crs="EPSG:4326")
@@ -46,32 +52,215 @@ def load_city(city_name="Bournemouth, UK"):
 
     return G_undirected
 
+# OSM features worth resolving by name (hubs, destinations)
+PLACE_TAGS = {
+    "railway": ["station", "halt", "tram_stop"],
+    "amenity": ["bus_station", "hospital", "school", "university"],
+}
+
+def download_places(city_name="Bournemouth, UK", tags=PLACE_TAGS):
+    """Named stations and amenities as (name, lat, lon, kind) tuples."""
+    try:
+        gdf = ox.features_from_place(city_name, tags=tags)
+    except Exception as e:
+        print("⚠️ Could not download named places:", e)
+        return []
+
+    places = []
+    for _, row in gdf.iterrows():
+        name = row.get("name")
+        if not isinstance(name, str) or not name:
+            continue
+        point = row.geometry.representative_point()
+        railway = row.get("railway")
+        kind = "station" if railway in ("station", "halt") else (row.get("amenity") or railway)
+        places.append((name, point.y, point.x, kind if isinstance(kind, str) else "place"))
+    return places
+
+def build_city_cache(city_name="Bournemouth, UK", network_type="walk", cache_dir=None):
+    """Download a city once and cache its graph, spatial index and gazetteer."""
+    G = download_city(city_name, network_type)
+    places = download_places(city_name)
+
+    cg = compile_graph(G)
+    save_compiled(cg, city_name, network_type, cache_dir)
+    G.graph["spatial_index"] = spatial_index(cg)
+    attached_index(cg, "gazetteer", lambda cg: build_gazetteer(G, places, tram_coords_lookup))
+    return cg
+
+def load_compiled_city(city_name="Bournemouth, UK", network_type="walk", refresh=False):
+    """Return the cached CompiledGraph for a city, building the cache entry on a miss."""
+    cg = None if refresh else load_compiled(city_name, network_type)
+    if cg is None:
+        build_city_cache(city_name, network_type)
+        cg = load_compiled(city_name, network_type)
+    return cg
+
+def load_city(city_name="Bournemouth, UK", network_type="walk", use_cache=True, refresh=False, as_networkx=False):
+    """
+    The cached CompiledGraph for a city (memory-mapped, so it loads in
+    milliseconds; its spatial index and gazetteer load on first use).
+
+    ``as_networkx`` returns an OSMnx-style MultiGraph built from it instead,
+    which costs a Python pass over every edge. ``use_cache=False`` downloads
+    the city afresh.
+    """
+    if not use_cache:
+        G = download_city(city_name, network_type)
+        return G if as_networkx else compile_graph(G)
+    cg = load_compiled_city(city_name, network_type, refresh=refresh)
+    if not as_networkx:
+        return cg
+    G = cg.to_networkx()
+    # Share the persisted indexes so snapping and geocoding never rebuild them
+    G.graph["spatial_index"] = spatial_index(cg)
+    G.graph["gazetteer"] = city_gazetteer(cg)
+    return G
+
+def city_gazetteer(graph):
+    """The gazetteer attached to a graph, built from its street names if missing."""
+    if isinstance(graph, ScenarioOverlay):
+        graph = graph.base
+    if isinstance(graph, CompiledGraph):
+        return attached_index(graph, "gazetteer", lambda cg: build_gazetteer(cg, (), tram_coords_lookup))
+    if "gazetteer" not in graph.graph:
+        graph.graph["gazetteer"] = build_gazetteer(graph, (), tram_coords_lookup)
+    return graph.graph["gazetteer"]
+
 def get_hub_node(G, location_name="Bournemouth Station"):
-    coords = ox.geocoder.geocode(location_name)
-    node = ox.distance.nearest_nodes(G, coords[1], coords[0])
-    return node
+    """
+    Node for a named hub: an exact gazetteer name, else a close match among
+    stations, stops and amenities (never streets, whose names often contain
+    the place's). Raises ValueError, listing the closest names, otherwise.
+    """
+    gazetteer = city_gazetteer(G)
+    try:
+        return gazetteer.lookup(location_name, exclude=("street",)).node
+    except KeyError:
+        candidates = [p.name for p in gazetteer.search(location_name)]
+        raise ValueError(
+            f"Unknown hub {location_name!r} for this city. Close gazetteer names: {candidates or 'none'}"
+        ) from None
+
+def node_coords(G, nodes):
+    """Longitudes and latitudes of nodes in a NetworkX, compiled or overlay graph."""
+    if isinstance(G, (CompiledGraph, ScenarioOverlay)):
+        rows = G.index_of(nodes)
+        return G.x[rows].tolist(), G.y[rows].tolist()
+    return [G.nodes[n]["x"] for n in nodes], [G.nodes[n]["y"] for n in nodes]
 
-def export_access_map(G, hub, distances, out_path, tramline_nodes=None, tramline_names=None):
-    import folium
-    from folium.plugins import MarkerCluster
+def hex_layer(bins, colors, name=None, unit="m", label="Homes"):
+    """A folium GeoJson layer of hexagon bins, filled with their ``colors``."""
+    def style(feature):
+        fill = "#{:02x}{:02x}{:02x}".format(*feature["properties"]["rgb"])
+        return {"fillColor": fill, "color": fill, "weight": 0, "fillOpacity": 0.6}
 
-    m = folium.Map(location=[50.72, -1.88], zoom_start=13)
-    mc = MarkerCluster().add_to(m)
+    return folium.GeoJson(
+        bins.to_geojson(colors), name=name, style_function=style,
+        tooltip=folium.GeoJsonTooltip(fields=["count", "mean", "min"],
+                                      aliases=[label, f"Mean ({unit})", f"Best ({unit})"])
+    )
 
-    for node, dist in distances.items():
-        x, y = G.nodes[node]["x"], G.nodes[node]["y"]
-        folium.CircleMarker(location=[y, x], radius=4,
-                            color="blue", fill=True, fill_opacity=0.6,
-                            popup=f"Node {node}, Dist: {dist:.0f}m").add_to(mc)
+def export_access_map(G, hub, distances, out_path, tramline_nodes=None, tramline_names=None, max_bins=MAX_BINS):
+    """
+    Access map of agent distances, binned into at most ``max_bins`` hexagons.
+
+    Each cell shows how many agent home nodes it holds and their mean
+    distance, so the file size does not grow with the number of agents. The same cells
+    are saved as GeoJSON next to the HTML (``.geojson``), followed by the
+    run's tramline through ``tramline_nodes`` as a LineString feature.
+    """
+    xs, ys = node_coords(G, list(distances))
+    bins = hex_bins(xs, ys, np.fromiter(distances.values(), dtype=np.float64, count=len(distances)),
+                    max_bins=max_bins)
+    colors = value_colors(bins.mean)
+    collection = bins.to_geojson(colors)
+    if tramline_nodes:
+        line_x, line_y = node_coords(G, list(tramline_nodes))
+        collection["features"].append({
+            "type": "Feature",
+            "geometry": {"type": "LineString", "coordinates": [[x, y] for x, y in zip(line_x, line_y)]},
+            "properties": {"tramline": list(tramline_names or [])},
+        })
+    save_geojson(os.path.splitext(out_path)[0] + ".geojson", collection)
+
+    center = [float(np.mean(ys)), float(np.mean(xs))] if len(xs) else [50.72, -1.88]
+    m = folium.Map(location=center, zoom_start=13)
+    if len(bins):
+        hex_layer(bins, colors).add_to(m)
 
     # Add tramline by name
     if tramline_names:
-        from city_loader import add_tramline_to_map
         add_tramline_to_map(m, tramline_names[0], tramline_names[1])
 
     m.save(out_path)
+    return out_path
+
 
+def export_isochrone_map(G, values, bands, out_path, unit="m", max_bins=MAX_BINS, tramline_names=None):
+    """
+    Isochrone map of a full accessibility surface (one value per node row).
 
+    Nodes are binned into at most ``max_bins`` hexagons coloured by the band
+    of their mean value, with one layer per band.
+    """
+    x, y = np.asarray(G.x), np.asarray(G.y)
+    reachable = np.flatnonzero(np.asarray(values) <= bands[-1])
+    bins = hex_bins(x[reachable], y[reachable], np.asarray(values)[reachable], max_bins=max_bins)
+    colors = value_colors(bins.mean, bands)
+    band = np.searchsorted(np.asarray(bands, dtype=np.float64), bins.mean, side="left")
 
+    m = folium.Map(location=[float(y.mean()), float(x.mean())], zoom_start=13)
+    lower = [0] + list(bands[:-1])
+    for b in range(len(bands)):
+        sel = band == b
+        if sel.any():
+            hex_layer(bins.subset(sel), colors[sel], name=f"{lower[b]:g}-{bands[b]:g} {unit}",
+                      unit=unit, label="Nodes").add_to(m)
+    if tramline_names:
+        add_tramline_to_map(m, tramline_names[0], tramline_names[1])
+    folium.LayerControl().add_to(m)
+    m.save(out_path)
+    return out_path
 
 
+def export_flow_map(usage, out_path, mode=None):
+    """
+    Flow heatmap of link usage as saved by edge_usage.save_edge_usage.
+
+    Line width and colour grow with the number of agents on each link (one
+    mode, or all modes together); tram links are drawn in red.
+    """
+    flows = np.array([usage["flows"][m] for m in ([mode] if mode else usage["modes"])], dtype=np.float64)
+    total = flows.sum(axis=0) if len(flows) else np.zeros(len(usage["coords"]))
+    if not len(total) or total.max() <= 0:
+        return None
+    scale = np.log1p(total) / np.log1p(total.max())
+    coords = np.asarray(usage["coords"])
+    tram = set(usage["tram"])
+
+    # One GeoJSON layer for every link, quietest first so the busiest are drawn on top
+    features = []
+    for i in np.argsort(total, kind="stable").tolist():
+        s = float(scale[i])
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "LineString", "coordinates": np.round(coords[i].reshape(2, 2), 5).tolist()},
+            "properties": {
+                "agents": int(total[i]),
+                "color": "red" if i in tram else f"#{int(255 * s):02x}{int(160 * (1 - s)):02x}{int(255 * (1 - s)):02x}",
+                "weight": round(1 + 7 * s, 1),
+            },
+        })
+
+    def style(feature):
+        props = feature["properties"]
+        return {"color": props["color"], "weight": props["weight"], "opacity": 0.8}
+
+    m = folium.Map(location=[float(coords[:, 1].mean()), float(coords[:, 0].mean())], zoom_start=13)
+    folium.GeoJson(
+        {"type": "FeatureCollection", "features": features}, name="Flows", style_function=style,
+        tooltip=folium.GeoJsonTooltip(fields=["agents"], aliases=["Agents"])
+    ).add_to(m)
+    m.save(out_path)
+    return out_path
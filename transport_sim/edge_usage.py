@@ -0,0 +1,101 @@
+import os
+import json
+import numpy as np
+from transport_sim.population import MODES, ACTIVE, mode_code
+
+# Links kept in an export by default, busiest first
+MAX_LINKS = 2000
+
+
+def mode_edge_flows(router, agents, mode):
+    """
+    Agents of one mode crossing each CSR edge of ``router``'s graph.
+
+    Agents are counted at their home nodes and pushed up each tree (one per
+    destination, or one forest for nearest-destination agents) with
+    ShortestPathTree.edge_flows, so no route is ever walked.
+    """
+    cg = router.cg
+    idx = np.flatnonzero((agents.mode == mode_code(mode)) & (agents.status == ACTIVE))
+    flows = np.zeros(cg.n_edges)
+    if agents.destinations is not None:
+        trees = [(router.forest(agents.destinations, mode), idx)]
+    else:
+        trees = [
+            (router.tree(dest, mode), idx[agents.destination[idx] == dest])
+            for dest in np.unique(agents.destination[idx]).tolist()
+        ]
+    for tree, sel in trees:
+        demand = np.bincount(cg.index_of(agents.home_node[sel]), minlength=cg.n_nodes)
+        flows += tree.edge_flows(demand)
+    return flows
+
+
+def edge_usage(agents):
+    """{mode: agents per CSR edge} for every mode of a routed population."""
+    if agents.router is None:
+        raise ValueError("Agents must be routed (plan_routes) before edge usage can be counted.")
+    active = agents.status == ACTIVE
+    return {
+        MODES[code]: mode_edge_flows(agents.router, agents, MODES[code])
+        for code in np.unique(agents.mode[active]).tolist()
+    }
+
+
+def link_usage(cg, usage):
+    """
+    Per-link table of an edge_usage result: (u, v, modes, flows, tram).
+
+    On undirected graphs both directions of a street count as one link.
+    ``flows`` has one row per link and one column per mode in ``modes``;
+    only used links are kept, busiest first.
+    """
+    modes = list(usage)
+    flows = np.stack([usage[m] for m in modes], axis=1) if modes else np.zeros((cg.n_edges, 0))
+    src, dst = cg.edge_sources(), np.asarray(cg.indices)
+    tram = np.asarray(cg.tram, dtype=bool)
+    if not cg.directed:
+        src, dst = np.minimum(src, dst), np.maximum(src, dst)
+
+    used = np.flatnonzero(flows.sum(axis=1) > 0)
+    keys = src[used] * cg.n_nodes + dst[used]
+    unique, link = np.unique(keys, return_inverse=True)
+    totals = np.zeros((len(unique), len(modes)))
+    np.add.at(totals, link, flows[used])
+    is_tram = np.zeros(len(unique), dtype=bool)
+    np.logical_or.at(is_tram, link, tram[used])
+
+    order = np.argsort(-totals.sum(axis=1), kind="stable")
+    u, v = unique[order] // cg.n_nodes, unique[order] % cg.n_nodes
+    return cg.node_ids[u], cg.node_ids[v], modes, totals[order], is_tram[order]
+
+
+def save_edge_usage(path, cg, usage, max_links=MAX_LINKS, precision=5):
+    """
+    Write link usage as compact columnar JSON for the flow map.
+
+    ``coords`` holds lon/lat pairs of both ends per link (rounded to
+    ``precision`` decimals), ``flows`` one integer list per mode and
+    ``tram`` the positions of tram links. Only the ``max_links`` busiest
+    links are kept.
+    """
+    u, v, modes, flows, tram = link_usage(cg, usage)
+    u, v, flows, tram = u[:max_links], v[:max_links], flows[:max_links], tram[:max_links]
+    ru, rv = cg.index_of(u), cg.index_of(v)
+    x, y = np.asarray(cg.x), np.asarray(cg.y)
+    coords = np.round(np.stack([x[ru], y[ru], x[rv], y[rv]], axis=1), precision)
+    data = {
+        "modes": modes,
+        "coords": coords.tolist(),
+        "flows": {m: np.rint(flows[:, i]).astype(np.int64).tolist() for i, m in enumerate(modes)},
+        "tram": np.flatnonzero(tram).tolist(),
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+    return path
+
+
+def load_edge_usage(path):
+    with open(path) as f:
+        return json.load(f)
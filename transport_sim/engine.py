@@ -0,0 +1,487 @@
+import os
+import csv
+import json
+import numpy as np
+from transport_sim.graph_cache import place_slug
+from transport_sim.city_loader import (
+    load_compiled_city, get_hub_node, export_access_map, export_flow_map, export_isochrone_map, tram_coords_lookup
+)
+from transport_sim.simulation import apply_scenario, draw_population, compute_stats, group_stats_by_mode, tram_spawn_nodes
+from transport_sim.routing import RoutingEngine
+from transport_sim.overlay import ScenarioOverlay
+from transport_sim.population import AgentPopulation
+from transport_sim.spatial_index import nearest_nodes
+from transport_sim.sweep import tramline_candidates, city_stops, sweep_tramlines, save_sweep
+from transport_sim.parametric import EdgeLengthSweep
+from transport_sim.replications import run_replications, save_replications, DEFAULT_REPLICATIONS
+from transport_sim.traffic import traffic_for
+from transport_sim.assignment import assign_traffic
+from transport_sim.edge_usage import edge_usage, save_edge_usage, load_edge_usage
+from transport_sim.accessibility import (
+    accessibility_surface, surface_delta, summarize_surfaces, save_surfaces, DISTANCE_BANDS, TIME_BANDS
+)
+from transport_sim.movement import MovementEngine, departure_times, DEPARTURE_SPREAD_MIN
+from transport_sim.hexbin import save_tiles
+from transport_sim.run_store import RunStore
+
+RESULTS_DIR = "transport_sim/results"
+
+
+class CityContext:
+    """Everything loaded once per city: compiled graph, indexes and the baseline router."""
+
+    def __init__(self, name, graph):
+        self.name = name
+        self.graph = graph
+        self.router = RoutingEngine(graph)
+        self.traffic_routers = {}
+        self.hubs = {}
+
+    def router_for(self, traffic):
+        """Router for a TrafficTime; free-flow times share the baseline router."""
+        if traffic is None or traffic.is_free_flow():
+            return self.router
+        key = (id(traffic.profile), traffic.key)
+        if key not in self.traffic_routers:
+            self.traffic_routers[key] = RoutingEngine(self.graph, traffic=traffic, free_flow=self.router)
+        return self.traffic_routers[key]
+
+    def hub(self, location_name):
+        if location_name not in self.hubs:
+            hub = get_hub_node(self.graph, location_name)
+            try:
+                self.graph.index_of(hub)
+            except KeyError:
+                raise ValueError("Hub node not in undirected graph.")
+            self.hubs[location_name] = hub
+        return self.hubs[location_name]
+
+
+class SimulationEngine:
+    """
+    Long-lived simulation service.
+
+    City graphs, spatial indexes, gazetteers, hub lookups and baseline
+    shortest-path trees stay in memory between calls, so only the first run
+    on a city pays for loading it.
+    """
+
+    def __init__(self, results_dir=RESULTS_DIR):
+        self.results_dir = results_dir
+        # Per-agent results of every run, under their own run IDs
+        self.runs = RunStore(os.path.join(results_dir, "runs"))
+        self._cities = {}
+
+    def city(self, name):
+        if name not in self._cities:
+            self._cities[name] = CityContext(name, load_compiled_city(name))
+        return self._cities[name]
+
+    def simulate(self, config, write_outputs=True):
+        """Run baseline and tramline scenarios for one config and return their stats."""
+        return self.simulate_matrix(config, write_outputs=write_outputs)[0]
+
+    def simulate_matrix(self, config, traffic=None, cities=None, tramlines=None, write_outputs=True):
+        """
+        Run every city × traffic level × tramline combination in one pass.
+
+        ``traffic`` is a list of levels (default: the config's), ``cities`` a
+        list of city names and ``tramlines`` a list of tramline_extension
+        scenarios. Work shared between variants is done once: each city is
+        loaded, geocoded and its agents drawn once, each tramline is snapped
+        into an overlay once, each baseline is routed once per traffic level,
+        and walk, cycle and tram trees are shared by all traffic levels.
+
+        Returns one result dict per variant, each with the variant's
+        ``config``. Stats files are written per variant; maps show the last
+        traffic level, as consecutive single runs used to. Each variant's
+        agents are also kept in the run store, under the returned ``run_id``
+        (routes too when ``store_routes`` is true in the config); the store
+        keeps the newest KEEP_RUNS runs.
+        """
+        levels = traffic or [config.get("traffic", "off-peak")]
+        cities = cities or [config["city"]]
+        tramlines = tramlines or [config["scenarios"]["tramline_extension"]]
+        matrix = len(cities) > 1 or len(tramlines) > 1
+
+        variants = []
+        for city_name in cities:
+            city = self.city(city_name)
+            hub = city.hub(config["hub"])
+            # Optional extra destinations (stations, hospitals, schools): agents go to the nearest
+            destinations = None
+            if config.get("destinations"):
+                destinations = [city.hub(name) for name in config["destinations"]]
+
+            # One draw per city: every variant routes the same agents
+            agents = draw_population(
+                city.graph, hub, config["num_agents"], config["agent_distribution"],
+                router=city.router, seed=config.get("seed")
+            )
+
+            # Tramline: a small overlay on the shared base graph instead of a copy
+            overlays = []
+            for scenario in tramlines:
+                G_scenario = ScenarioOverlay(city.graph)
+                n1_id, n2_id = apply_scenario(G_scenario, scenario)
+                print(f"✅ Tramline edge added: {n1_id} ↔ {n2_id}")
+                # Scenario trees are incremental updates of the baseline trees
+                free_flow = RoutingEngine(G_scenario, base_router=city.router)
+                if n1_id is not None:
+                    reachable = bool(free_flow.tree(hub, "walk").is_reachable(n1_id))
+                    print(f"🔗 Path exists to hub: {reachable}")
+                overlays.append((scenario, G_scenario, free_flow))
+
+            for level in levels:
+                variant_config = dict(config, city=city_name, traffic=level)
+                # Traffic only rescales driving costs; the warm graph is shared by every time of day
+                router = city.router_for(traffic_for(variant_config))
+                # Optional congestion feedback: drivers equilibrate on BPR costs of their own flows
+                congestion = config.get("congestion")
+                options = congestion if isinstance(congestion, dict) else {}
+                baseline_router = router
+                if congestion:
+                    baseline_router = assign_traffic(router, agents, destinations=destinations, **options)["router"]
+
+                print(f"Running baseline ({city_name}, {level})...")
+                baseline_agents = agents.copy()
+                baseline_agents.plan_routes(baseline_router, destinations=destinations)
+                baseline_stats = compute_stats(baseline_agents)
+                baseline_stats["by_mode"] = group_stats_by_mode(baseline_agents)
+
+                for t, (scenario, G_scenario, free_flow) in enumerate(overlays):
+                    scenario_router = free_flow
+                    if router is not city.router:
+                        scenario_router = RoutingEngine(
+                            G_scenario, base_router=router, traffic=router.traffic, free_flow=free_flow
+                        )
+                    if congestion:
+                        # Drivers re-equilibrate with the tramline in place
+                        scenario_router = assign_traffic(
+                            scenario_router, agents, destinations=destinations, **options
+                        )["router"]
+
+                    print(f"Running tramline extension ({' → '.join(map(str, scenario.get('tram_stops', [])))})...")
+                    tramline_agents = agents.copy()
+                    tramline_agents.plan_routes(scenario_router, destinations=destinations)
+                    tramline_stats = compute_stats(tramline_agents)
+                    tramline_stats["by_mode"] = group_stats_by_mode(tramline_agents)
+
+                    # Same agents: report who the scenario actually affects
+                    changed = int(tramline_agents.changed_from(baseline_agents).sum())
+                    print(f"🔁 {changed} of {len(tramline_agents)} agents changed")
+
+                    result_config = dict(variant_config, scenarios=dict(config["scenarios"], tramline_extension=scenario))
+                    if matrix:
+                        result_config["tramline"] = scenario.get("tram_stops", config.get("tramline"))
+                    variants.append({
+                        "config": result_config,
+                        "tramline_index": t,
+                        "baseline": baseline_stats,
+                        "tramline": tramline_stats,
+                        "baseline_agents": baseline_agents,
+                        "tramline_agents": tramline_agents,
+                        "graphs": (city.graph, G_scenario, hub),
+                    })
+
+        if write_outputs:
+            self._write_variants(variants, matrix)
+        for variant in variants:
+            del variant["graphs"]
+        return variants
+
+    def _write_variants(self, variants, matrix):
+        # Maps for the last traffic level of each city and tramline; stats for every variant
+        last = {}
+        for variant in variants:
+            last[(variant["config"]["city"], variant["tramline_index"])] = variant
+        for variant in variants:
+            c = variant["config"]
+            suffix, map_suffix = None, ""
+            if matrix:
+                level = c.get("traffic", "off-peak").replace("-", "").replace(" ", "").lower()
+                map_suffix = f"_{place_slug(c['city'])}_t{variant['tramline_index']}"
+                suffix = f"{map_suffix[1:]}_{level}"
+            G_base, G_scenario, hub = variant["graphs"]
+            maps = variant is last[(c["city"], variant["tramline_index"])]
+            variant["outputs"] = self.write_outputs(
+                c, G_base, G_scenario, hub, variant["baseline_agents"], variant["tramline_agents"],
+                variant["baseline"], variant["tramline"], suffix=suffix, maps=maps, map_suffix=map_suffix
+            )
+            variant["run_id"] = self.runs.add_run(
+                c, {"baseline": variant["baseline_agents"], "tramline": variant["tramline_agents"]},
+                routes=c.get("store_routes", False)
+            )
+
+    def sweep(self, config, candidates=None, processes=None, max_stops=2, write_outputs=True):
+        """
+        Rank tramline candidates for the config's city by accessibility gain.
+
+        Defaults to every ordered line of up to ``max_stops`` stops that lie in
+        the city. The same seeded agents are used for every candidate.
+        """
+        city = self.city(config["city"])
+        hub = city.hub(config["hub"])
+        if candidates is None:
+            length = config["scenarios"]["tramline_extension"].get("length", 300)
+            candidates = tramline_candidates(city_stops(city.graph), length, max_stops)
+
+        agents = draw_population(
+            city.graph, hub, config["num_agents"], config["agent_distribution"],
+            router=city.router, seed=config.get("seed", 0)
+        )
+        rows = sweep_tramlines(city.router, hub, agents, candidates, processes=processes)
+        if write_outputs:
+            path = save_sweep(rows, os.path.join(self.results_dir, "tramline_sweep.csv"))
+            print(f"✅ Saved ranked tramline sweep to {path}")
+        return rows
+
+    def length_sweep(self, config, lengths, gain=0.0, write_outputs=True):
+        """
+        Stats for the config's tramline at every edge length in ``lengths``.
+
+        Routes once: agent distances are piecewise-linear in the tram edge
+        length, so each extra length costs a few array operations. Also
+        reports the break-even lengths where the average gain crosses ``gain``.
+        """
+        city = self.city(config["city"])
+        hub = city.hub(config["hub"])
+        agents = draw_population(
+            city.graph, hub, config["num_agents"], config["agent_distribution"],
+            router=city.router, seed=config.get("seed", 0)
+        )
+        baseline = AgentPopulation(agents.home_node, agents.mode.copy(), hub)
+        baseline.plan_routes(city.router)
+        baseline_avg = baseline.stats()["avg_distance"]
+
+        sweep = EdgeLengthSweep.from_scenario(city.router, hub, config["scenarios"]["tramline_extension"], agents)
+        rows = []
+        for length, stats in zip(np.atleast_1d(lengths).tolist(), sweep.stats(lengths)):
+            avg = stats["avg_distance"]
+            delta = None if avg is None or baseline_avg is None else baseline_avg - avg
+            rows.append({"length": length, "avg_distance": avg, "gain": delta,
+                         "unreachable": stats["unreachable"], "stats": stats})
+        break_even = sweep.break_even(baseline_avg, gain).tolist() if baseline_avg is not None else []
+        print(f"⚖️ Break-even tram edge lengths: {[round(x, 1) for x in break_even]}")
+
+        if write_outputs:
+            os.makedirs(self.results_dir, exist_ok=True)
+            path = os.path.join(self.results_dir, "tram_length_sweep.csv")
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["length", "avg_distance", "gain", "unreachable"])
+                for row in rows:
+                    writer.writerow([row["length"], row["avg_distance"], row["gain"], row["unreachable"]])
+            print(f"✅ Saved tram length sweep to {path}")
+        return {"baseline_avg": baseline_avg, "rows": rows, "break_even": break_even}
+
+    def replicate(self, config, replications=None, processes=None, confidence=0.95, write_outputs=True):
+        """
+        Monte Carlo replications of the config's baseline and tramline.
+
+        Replication seeds derive from ``config["seed"]``; each replication's
+        agents are routed through both variants (common random numbers), and
+        every per-mode metric is reported with a ``confidence`` interval.
+        """
+        city = self.city(config["city"])
+        hub = city.hub(config["hub"])
+        destinations = None
+        if config.get("destinations"):
+            destinations = [city.hub(name) for name in config["destinations"]]
+        population = {
+            "num_agents": config["num_agents"],
+            "agent_distribution": config["agent_distribution"],
+            "tram_nodes": tram_spawn_nodes(city.graph),
+        }
+        replications = replications or config.get("replications", DEFAULT_REPLICATIONS)
+        print(f"🎲 Running {replications} replications ({config['city']}, {config.get('traffic', 'off-peak')})...")
+        result = run_replications(
+            city.router_for(traffic_for(config)), hub, population, config["scenarios"]["tramline_extension"],
+            seed=config.get("seed", 0), replications=replications, processes=processes,
+            confidence=confidence, destinations=destinations
+        )
+        if write_outputs:
+            suffix = "_" + config.get("traffic", "off-peak").replace("-", "").replace(" ", "").lower()
+            paths = save_replications(result, self.results_dir, suffix)
+            print(f"✅ Saved replications to {', '.join(paths)}")
+        return result
+
+    def move(self, config, snapshot_every=300, tick=1.0, scenario=False, write_outputs=True):
+        """
+        Move the config's agents along their routes over time.
+
+        Departures are spread around ``sim_time`` (``departure_spread_min``
+        minutes either way); the discrete-event engine then reports occupancy
+        every ``snapshot_every`` seconds. With ``scenario`` the tramline
+        overlay is used instead of the baseline graph.
+        """
+        city = self.city(config["city"])
+        hub = city.hub(config["hub"])
+        router = city.router_for(traffic_for(config))
+        if scenario:
+            G_scenario = ScenarioOverlay(city.graph)
+            apply_scenario(G_scenario, config["scenarios"]["tramline_extension"])
+            router = RoutingEngine(G_scenario, base_router=router, traffic=router.traffic)
+
+        agents = draw_population(
+            city.graph, hub, config["num_agents"], config["agent_distribution"],
+            router=city.router, seed=config.get("seed")
+        )
+        agents.plan_routes(router)
+        seed = config.get("seed")
+        departures = departure_times(
+            len(agents), config.get("sim_time", "08:00"), config.get("departure_spread_min", DEPARTURE_SPREAD_MIN),
+            rng=None if seed is None else [seed, 1]
+        )
+        print(f"🚶 Moving {len(agents)} agents ({config['city']}, {config.get('traffic', 'off-peak')})...")
+        movement = MovementEngine(agents, departures, tick=tick)
+        snapshots = movement.run(snapshot_every=snapshot_every)
+        print(f"✅ {movement.traversals} edge traversals")
+
+        travel = movement.arrival - movement.departure
+        travel_time = {}
+        for mode, idx in agents.group_by_mode().items():
+            t = travel[idx][np.isfinite(travel[idx])]
+            if len(t):
+                travel_time[mode] = {"avg_s": float(t.mean()), "max_s": float(t.max()), "count": len(t)}
+
+        if write_outputs:
+            os.makedirs(self.results_dir, exist_ok=True)
+            name = "tramline" if scenario else "baseline"
+            suffix = config.get("traffic", "off-peak").replace("-", "").replace(" ", "").lower()
+            path = os.path.join(self.results_dir, f"{name}_movement_{suffix}.csv")
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["time", "mode", "waiting", "moving", "arrived", "busiest_edge_agents"])
+                for snap in snapshots:
+                    busiest = int(snap["counts"].max()) if len(snap["counts"]) else 0
+                    for mode, counts in snap["modes"].items():
+                        writer.writerow([snap["time"], mode, counts["waiting"], counts["moving"],
+                                         counts["arrived"], busiest])
+            print(f"✅ Saved movement snapshots to {path}")
+        return {"snapshots": snapshots, "travel_time": travel_time, "movement": movement}
+
+    def accessibility(self, config, metric="distance", cutoff=None, bands=None, map_mode="walk",
+                      tile_zooms=None, write_outputs=True):
+        """
+        Sample-free accessibility surfaces from every node to the hub, per mode.
+
+        Computes baseline and tramline surfaces (metres or seconds, bounded
+        by ``cutoff``), isochrone band counts and per-node deltas from one
+        tree per mode and variant, independent of ``num_agents``. With
+        ``tile_zooms`` the ``map_mode`` surfaces are also written as tiled
+        hexagon GeoJSON (``<variant>_tiles_<mode>/<zoom>/<x>/<y>.geojson``).
+        """
+        city = self.city(config["city"])
+        hub = city.hub(config["hub"])
+        router = city.router_for(traffic_for(config))
+        G_scenario = ScenarioOverlay(city.graph)
+        apply_scenario(G_scenario, config["scenarios"]["tramline_extension"])
+        scenario_router = RoutingEngine(G_scenario, base_router=router, traffic=router.traffic)
+        bands = bands or (DISTANCE_BANDS if metric == "distance" else TIME_BANDS)
+
+        surfaces = {
+            "baseline": accessibility_surface(router, hub, metric=metric, cutoff=cutoff),
+            "tramline": accessibility_surface(scenario_router, hub, metric=metric, cutoff=cutoff),
+        }
+        summary = summarize_surfaces(surfaces["baseline"], surfaces["tramline"], bands, cutoff)
+        summary.update(metric=metric, cutoff=cutoff)
+
+        if write_outputs:
+            suffix = config.get("traffic", "off-peak").replace("-", "").replace(" ", "").lower()
+            path = save_surfaces(
+                os.path.join(self.results_dir, f"accessibility_{suffix}.npz"), city.graph, surfaces, summary
+            )
+            print(f"✅ Saved accessibility surfaces to {path}")
+            unit = "m" if metric == "distance" else "s"
+            for name, surface in surfaces.items():
+                map_path = os.path.join(self.results_dir, f"{name}_isochrones_{map_mode}.html")
+                export_isochrone_map(city.graph, surface[map_mode], bands, map_path, unit=unit,
+                                     tramline_names=config.get("tramline") if name == "tramline" else None)
+                print(f"✅ Saved {name} isochrone map to {map_path}")
+                if tile_zooms:
+                    tiles = save_tiles(os.path.join(self.results_dir, f"{name}_tiles_{map_mode}"),
+                                       city.graph.x, city.graph.y, surface[map_mode], tile_zooms, bands=bands)
+                    print(f"✅ Saved {name} surface tiles to {tiles}")
+        return {"surfaces": surfaces, "delta": surface_delta(surfaces["baseline"], surfaces["tramline"]),
+                "summary": summary}
+
+    def write_outputs(self, config, G_base, G_scenario, hub, baseline_agents, tramline_agents,
+                      baseline_stats, tramline_stats, suffix=None, maps=True, map_suffix=""):
+        os.makedirs(self.results_dir, exist_ok=True)
+        outputs = []
+        if suffix is None:
+            suffix = config.get("traffic", "off-peak").replace("-", "").lower()  # "offpeak" or "peak"
+        if maps:
+            outputs += self.write_maps(
+                config, G_base, G_scenario, hub, baseline_agents, tramline_agents, map_suffix
+            )
+
+        for name, stats in [("baseline", baseline_stats), ("tramline", tramline_stats)]:
+            path = os.path.join(self.results_dir, f"{name}_stats_{suffix}.json")
+            with open(path, "w") as f:
+                json.dump(stats, f)
+            outputs.append(path)
+
+        # Link usage per mode, for the flow heatmaps
+        for name, agents in [("baseline", baseline_agents), ("tramline", tramline_agents)]:
+            path = save_edge_usage(
+                os.path.join(self.results_dir, f"{name}_edge_usage_{suffix}.json"),
+                agents.router.cg, edge_usage(agents)
+            )
+            outputs.append(path)
+            if maps:
+                map_path = os.path.join(self.results_dir, f"{name}_flows{map_suffix}.html")
+                if export_flow_map(load_edge_usage(path), map_path):
+                    print(f"✅ Saved {name} flow map to {map_path}")
+                    outputs.append(map_path)
+
+        return outputs
+
+    def write_maps(self, config, G_base, G_scenario, hub, baseline_agents, tramline_agents, suffix=""):
+        outputs = []
+
+        # --- Convert tram stop names to node IDs ---
+        tram_stops = config["scenarios"]["tramline_extension"]["tram_stops"]
+        if isinstance(tram_stops[0], str):
+            latlon1 = tram_coords_lookup.get(tram_stops[0])
+            latlon2 = tram_coords_lookup.get(tram_stops[1])
+            if latlon1 and latlon2:
+                tramline_nodes = nearest_nodes(
+                    G_scenario, [latlon1[1], latlon2[1]], [latlon1[0], latlon2[0]]
+                ).tolist()
+            else:
+                raise ValueError("Tram stop names not found in lookup.")
+        else:
+            tramline_nodes = tram_stops
+
+        path = os.path.join(self.results_dir, f"baseline_access{suffix}.html")
+        export_access_map(G_base, hub, baseline_agents.home_distances(), out_path=path)
+        print(f"✅ Saved baseline map to {path}")
+        outputs += [path, os.path.splitext(path)[0] + ".geojson"]
+
+        path = os.path.join(self.results_dir, f"tramline_access_colored{suffix}.html")
+        export_access_map(
+            G_scenario,
+            hub,
+            tramline_agents.home_distances(),
+            out_path=path,
+            tramline_nodes=tramline_nodes,
+            tramline_names=config["tramline"]
+        )
+        print(f"✅ Saved tramline map to {path}")
+        outputs += [path, os.path.splitext(path)[0] + ".geojson"]
+        return outputs
+
+
+_engine = None
+
+def get_engine():
+    """The process-wide engine, created on first use."""
+    global _engine
+    if _engine is None:
+        _engine = SimulationEngine()
+    return _engine
+
+def simulate(config, write_outputs=True):
+    return get_engine().simulate(config, write_outputs=write_outputs)
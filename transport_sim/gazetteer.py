@@ -0,0 +1,139 @@
+import re
+import difflib
+from collections import namedtuple, defaultdict
+import numpy as np
+from transport_sim.graph_cache import CompiledGraph
+from transport_sim.spatial_index import spatial_index
+
+Place = namedtuple("Place", ["name", "lat", "lon", "node", "kind"])
+
+
+def normalize_name(name):
+    name = re.sub(r"[^a-z0-9]+", " ", name.lower()).strip()
+    # "Bournemouth Station, UK" and "Bournemouth Station" are the same place
+    return re.sub(r"\s+(uk|united kingdom|england)$", "", name)
+
+
+class Gazetteer:
+    """
+    Offline name -> coordinates/node lookup for one city graph.
+
+    Exact lookups are a dict hit on the normalised name; anything else falls
+    back to fuzzy matching against the known names.
+    """
+
+    def __init__(self, places=()):
+        self.places = []
+        self._by_name = {}
+        for place in places:
+            self._insert(place)
+
+    def _insert(self, place):
+        key = normalize_name(place.name)
+        if key and key not in self._by_name:
+            self._by_name[key] = len(self.places)
+            self.places.append(place)
+
+    def __len__(self):
+        return len(self.places)
+
+    def __contains__(self, name):
+        return normalize_name(name) in self._by_name
+
+    def add(self, name, lat, lon, node=None, kind="manual"):
+        self._insert(Place(name, float(lat), float(lon), node, kind))
+
+    def _keys(self, exclude=()):
+        if not exclude:
+            return self._by_name.keys()
+        return [k for k, i in self._by_name.items() if self.places[i].kind not in exclude]
+
+    def lookup(self, name, fuzzy=True, cutoff=0.8, exclude=()):
+        """
+        Return the Place for ``name``; raise KeyError when nothing matches.
+
+        Fuzzy matches skip places whose kind is in ``exclude`` (exact names
+        always match).
+        """
+        key = normalize_name(name)
+        if key in self._by_name:
+            return self.places[self._by_name[key]]
+
+        if fuzzy:
+            match = difflib.get_close_matches(key, self._keys(exclude), n=1, cutoff=cutoff)
+            if match:
+                return self.places[self._by_name[match[0]]]
+        raise KeyError(f"No place named {name!r} in the gazetteer.")
+
+    def search(self, name, n=5, cutoff=0.6, exclude=()):
+        """Up to ``n`` fuzzy candidates, best first."""
+        keys = difflib.get_close_matches(normalize_name(name), self._keys(exclude), n=n, cutoff=cutoff)
+        return [self.places[self._by_name[k]] for k in keys]
+
+    def geocode(self, name):
+        """(lat, lon) like ox.geocoder.geocode, without the network."""
+        place = self.lookup(name)
+        return place.lat, place.lon
+
+
+def _street_places(G):
+    # One entry per street name, placed at the median of its edge midpoints
+    points = defaultdict(list)
+    for u, v, name in G.edges(data="name"):
+        if not name:
+            continue
+        for n in (name if isinstance(name, list) else [name]):
+            points[n].append((
+                (G.nodes[u]["y"] + G.nodes[v]["y"]) / 2,
+                (G.nodes[u]["x"] + G.nodes[v]["x"]) / 2,
+            ))
+    for name, pts in points.items():
+        lat, lon = np.median(np.array(pts), axis=0)
+        yield name, lat, lon, "street"
+
+
+def _bounds(graph):
+    # (min lon, min lat, max lon, max lat) of the graph's nodes
+    if isinstance(graph, CompiledGraph):
+        x, y = np.asarray(graph.x), np.asarray(graph.y)
+    else:
+        x = np.array([d["x"] for _, d in graph.nodes(data=True)])
+        y = np.array([d["y"] for _, d in graph.nodes(data=True)])
+    if not len(x):
+        return None
+    return x.min(), y.min(), x.max(), y.max()
+
+
+def build_gazetteer(graph, places=(), extra_places=None):
+    """
+    Index named places for a city graph and snap each one to its nearest node.
+
+    ``places`` are (name, lat, lon, kind) tuples such as OSM stations;
+    ``extra_places`` is a {name: (lat, lon)} dict like tram_coords_lookup,
+    of which only the places inside the graph's bounding box are kept (so
+    another city's stops never snap to this city's edge). Street names are
+    read from the edges of a NetworkX graph.
+    """
+    entries = []
+    bounds = _bounds(graph)
+    for name, (lat, lon) in (extra_places or {}).items():
+        if bounds is None or not (bounds[0] <= lon <= bounds[2] and bounds[1] <= lat <= bounds[3]):
+            continue
+        entries.append((name, lat, lon, "tram_stop"))
+    for name, lat, lon, kind in places:
+        entries.append((name, lat, lon, kind))
+        # Stations are usually tagged with the bare town name in OSM
+        if kind == "station" and not normalize_name(name).endswith("station"):
+            entries.append((f"{name} Station", lat, lon, kind))
+    if not isinstance(graph, CompiledGraph):
+        entries.extend(_street_places(graph))
+
+    if not entries:
+        return Gazetteer()
+
+    names, lats, lons, kinds = zip(*entries)
+    nodes = spatial_index(graph).nearest(np.array(lats), np.array(lons))
+    return Gazetteer(
+        Place(n, float(la), float(lo), int(node), k)
+        for n, la, lo, node, k in zip(names, lats, lons, nodes.tolist(), kinds)
+    )
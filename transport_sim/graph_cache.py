@@ -0,0 +1,324 @@
+import os
+import re
+import json
+import shutil
+import pickle
+import argparse
+import numpy as np
+
+# Bump whenever the on-disk layout or the cleaning steps in load_city change,
+# so stale caches are treated as a miss instead of being loaded silently.
+CACHE_VERSION = 3
+
+CACHE_DIR = os.environ.get(
+    "SKYRAL_GRAPH_CACHE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+)
+
+DEFAULT_PREBUILD_CITIES = ["Bournemouth", "Poole", "Southampton"]
+
+_ARRAYS = ["node_ids", "x", "y", "indptr", "indices", "length", "highway", "speed_kph", "tram"]
+
+
+class CompiledGraph:
+    """
+    Contiguous array form of a cleaned city graph.
+
+    Nodes are stored sorted by OSM id. Edges are stored in CSR order: the
+    out-edges of node row ``i`` are ``indices[indptr[i]:indptr[i + 1]]`` with
+    matching per-edge attribute arrays. Undirected edges appear once in each
+    direction and parallel edges are kept as separate entries.
+    """
+
+    def __init__(self, node_ids, x, y, indptr, indices, length, highway, speed_kph, tram,
+                 highway_classes, directed=False, meta=None):
+        self.node_ids = node_ids
+        self.x = x
+        self.y = y
+        self.indptr = indptr
+        self.indices = indices
+        self.length = length
+        self.highway = highway
+        self.speed_kph = speed_kph
+        self.tram = tram
+        self.highway_classes = list(highway_classes)
+        self.directed = directed
+        self.meta = meta or {}
+        # Cache directory this graph was loaded from, and derived indexes
+        # (spatial, gazetteer, ...) attached to it once built
+        self.path = None
+        self.indexes = {}
+
+    @property
+    def n_nodes(self):
+        return len(self.node_ids)
+
+    @property
+    def n_edges(self):
+        return len(self.indices)
+
+    def edge_sources(self):
+        """Row index of the source node of every CSR edge."""
+        return np.repeat(np.arange(self.n_nodes), np.diff(self.indptr))
+
+    def index_of(self, node_ids):
+        """Map OSM node ids (scalar or array) to row indices."""
+        ids = np.asarray(node_ids, dtype=np.int64)
+        rows = np.searchsorted(self.node_ids, ids)
+        rows = np.minimum(rows, self.n_nodes - 1)
+        missing = self.node_ids[rows] != ids
+        if np.any(missing):
+            raise KeyError(f"Node(s) not in graph: {np.atleast_1d(ids[missing])[:5].tolist()}")
+        return rows
+
+    def to_networkx(self):
+        """Rebuild the undirected OSMnx-style MultiGraph that load_city(as_networkx=True) returns."""
+        import networkx as nx
+
+        G = nx.MultiDiGraph() if self.directed else nx.MultiGraph()
+        G.graph["crs"] = "EPSG:4326"
+        node_ids = self.node_ids.tolist()
+        G.add_nodes_from(
+            (n, {"x": float(x), "y": float(y)})
+            for n, x, y in zip(node_ids, self.x.tolist(), self.y.tolist())
+        )
+
+        src = self.edge_sources()
+        dst = np.asarray(self.indices)
+        keep = np.ones(self.n_edges, dtype=bool) if self.directed else src <= dst
+        if not self.directed:
+            # Self-loops are stored once per direction like any other edge
+            loops = np.flatnonzero(src == dst)
+            keep[loops[1::2]] = False
+
+        for e in np.flatnonzero(keep).tolist():
+            data = {"length": float(self.length[e])}
+            hw = self.highway[e]
+            if hw > 0:
+                data["highway"] = self.highway_classes[hw]
+            if not np.isnan(self.speed_kph[e]):
+                data["speed_kph"] = float(self.speed_kph[e])
+            if self.tram[e]:
+                data["tram"] = True
+            G.add_edge(node_ids[src[e]], node_ids[dst[e]], **data)
+        return G
+
+
+def _highway_name(value):
+    # OSMnx keeps a list of tags when simplification merges differently-tagged ways
+    if isinstance(value, (list, tuple)):
+        value = value[0] if value else None
+    return value or ""
+
+
+def compile_graph(G):
+    """Convert an OSMnx/NetworkX graph into a CompiledGraph."""
+    node_ids = np.array(sorted(G.nodes), dtype=np.int64)
+    row = {n: i for i, n in enumerate(node_ids.tolist())}
+    x = np.array([G.nodes[n].get("x", np.nan) for n in node_ids.tolist()], dtype=np.float64)
+    y = np.array([G.nodes[n].get("y", np.nan) for n in node_ids.tolist()], dtype=np.float64)
+
+    highway_classes = [""]
+    class_code = {"": 0}
+    src, dst, length, highway, speed, tram = [], [], [], [], [], []
+
+    def add(u, v, code, data):
+        src.append(row[u])
+        dst.append(row[v])
+        length.append(data.get("length", 1))
+        highway.append(code)
+        speed.append(data.get("speed_kph", np.nan))
+        tram.append(bool(data.get("tram", False)))
+
+    for u, v, data in G.edges(data=True):
+        name = _highway_name(data.get("highway"))
+        if name not in class_code:
+            class_code[name] = len(highway_classes)
+            highway_classes.append(name)
+        code = class_code[name]
+        add(u, v, code, data)
+        if not G.is_directed():
+            add(v, u, code, data)
+
+    return compile_arrays(node_ids, x, y, src, dst, length, highway, speed, tram,
+                          highway_classes, G.is_directed())
+
+
+def compile_arrays(node_ids, x, y, src, dst, length, highway, speed_kph, tram,
+                   highway_classes, directed=False):
+    """Build a CompiledGraph from per-edge arrays given as source/target node rows."""
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    order = np.lexsort((dst, src))
+    indptr = np.zeros(len(node_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=len(node_ids)), out=indptr[1:])
+
+    return CompiledGraph(
+        node_ids=node_ids,
+        x=x,
+        y=y,
+        indptr=indptr,
+        indices=dst[order],
+        length=np.asarray(length, dtype=np.float64)[order],
+        highway=np.asarray(highway, dtype=np.int16)[order],
+        speed_kph=np.asarray(speed_kph, dtype=np.float64)[order],
+        tram=np.asarray(tram, dtype=bool)[order],
+        highway_classes=highway_classes,
+        directed=directed,
+    )
+
+
+def place_slug(place):
+    """Filename-safe form of a place name: "Bournemouth, UK" -> "bournemouth-uk"."""
+    return re.sub(r"[^a-z0-9]+", "-", place.lower()).strip("-")
+
+
+def cache_key(place, network_type="walk"):
+    return f"{place_slug(place)}__{network_type}"
+
+
+def cache_path(place, network_type="walk", cache_dir=None):
+    return os.path.join(cache_dir or CACHE_DIR, cache_key(place, network_type))
+
+
+def save_compiled(cg, place, network_type="walk", cache_dir=None):
+    """Write a CompiledGraph to the cache, replacing any previous entry atomically."""
+    path = cache_path(place, network_type, cache_dir)
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    for name in _ARRAYS:
+        np.save(os.path.join(tmp_path, f"{name}.npy"), np.ascontiguousarray(getattr(cg, name)))
+
+    meta = dict(cg.meta)
+    meta.update({
+        "version": CACHE_VERSION,
+        "place": place,
+        "network_type": network_type,
+        "directed": cg.directed,
+        "n_nodes": cg.n_nodes,
+        "n_edges": cg.n_edges,
+        "highway_classes": cg.highway_classes,
+    })
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    cg.meta = meta
+    cg.path = path
+    return path
+
+
+def load_compiled(place, network_type="walk", cache_dir=None, mmap=True):
+    """Load a cached CompiledGraph, or return None on a miss or version mismatch."""
+    path = cache_path(place, network_type, cache_dir)
+    meta_path = os.path.join(path, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if meta.get("version") != CACHE_VERSION:
+        return None
+
+    arrays = {
+        name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None)
+        for name in _ARRAYS
+    }
+    cg = CompiledGraph(
+        highway_classes=meta["highway_classes"],
+        directed=meta.get("directed", False),
+        meta=meta,
+        **arrays
+    )
+    cg.path = path
+    return cg
+
+
+def attached_index(cg, name, build):
+    """
+    Return a derived index for ``cg``, building it at most once.
+
+    Indexes live in ``cg.indexes`` and, for cached graphs, are pickled next to
+    the graph arrays so later loads skip the build entirely.
+    """
+    if name in cg.indexes:
+        return cg.indexes[name]
+
+    index = None
+    index_path = os.path.join(cg.path, f"{name}.pkl") if cg.path else None
+    if index_path and os.path.exists(index_path):
+        with open(index_path, "rb") as f:
+            index = pickle.load(f)
+    if index is None:
+        index = build(cg)
+        if cg.path:
+            save_index(cg.path, name, index)
+
+    cg.indexes[name] = index
+    return index
+
+
+def save_index(path, name, index):
+    """(Re)write a derived index next to the cached graph arrays in ``path``."""
+    index_path = os.path.join(path, f"{name}.pkl")
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, index_path)
+
+
+def invalidate(place=None, network_type=None, cache_dir=None):
+    """Delete cached graphs. With no place, the whole cache is cleared."""
+    root = cache_dir or CACHE_DIR
+    if not os.path.isdir(root):
+        return []
+
+    removed = []
+    for entry in sorted(os.listdir(root)):
+        slug, _, ntype = entry.partition("__")
+        if place is not None and slug != cache_key(place).partition("__")[0]:
+            continue
+        if network_type is not None and ntype != network_type:
+            continue
+        shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+        removed.append(entry)
+    return removed
+
+
+def prebuild(places=None, network_type="walk", cache_dir=None):
+    """Download, clean and index the given cities so later runs stay offline."""
+    from transport_sim.city_loader import build_city_cache
+
+    built = {}
+    for place in places or DEFAULT_PREBUILD_CITIES:
+        cg = build_city_cache(place, network_type, cache_dir)
+        built[place] = cg.path
+        print(f"✅ Cached {place} ({cg.n_nodes} nodes, {cg.n_edges} edges) -> {built[place]}")
+    return built
+
+
+if __name__ == "__main__":
+    import sys
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+    parser = argparse.ArgumentParser(description="Manage the compiled city graph cache.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_build = sub.add_parser("prebuild", help="Download and cache city graphs")
+    p_build.add_argument("places", nargs="*", default=DEFAULT_PREBUILD_CITIES)
+    p_build.add_argument("--network-type", default="walk")
+
+    p_clear = sub.add_parser("invalidate", help="Remove cached city graphs")
+    p_clear.add_argument("places", nargs="*")
+    p_clear.add_argument("--network-type", default=None)
+
+    args = parser.parse_args()
+    if args.command == "prebuild":
+        prebuild(args.places, args.network_type)
+    else:
+        for place in args.places or [None]:
+            for entry in invalidate(place, args.network_type):
+                print(f"🗑️ Removed {entry}")
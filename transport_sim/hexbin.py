@@ -0,0 +1,241 @@
+import os
+import json
+import numpy as np
+from transport_sim.spatial_index import EARTH_RADIUS_M
+
+# Cells in one map layer: about 200 bytes of GeoJSON each, so a few MB at most
+MAX_BINS = 5000
+# Cells across one slippy-map tile in tiled exports
+TILE_CELLS = 32
+
+# Band colours, nearest first (as in the isochrone maps)
+BAND_COLORS = [(26, 152, 80), (145, 207, 96), (217, 239, 139), (254, 224, 139), (252, 141, 89), (215, 48, 39)]
+
+_SQRT3 = np.sqrt(3)
+_METRES_PER_DEG = np.pi * EARTH_RADIUS_M / 180
+
+
+def _project(lon, lat, origin):
+    # Local equirectangular metres around ``origin``: plenty for city extents
+    lon0, lat0 = origin
+    return (lon - lon0) * _METRES_PER_DEG * np.cos(np.radians(lat0)), (lat - lat0) * _METRES_PER_DEG
+
+
+def _unproject(x, y, origin):
+    lon0, lat0 = origin
+    return lon0 + x / (_METRES_PER_DEG * np.cos(np.radians(lat0))), lat0 + y / _METRES_PER_DEG
+
+
+def hex_cells(x, y, size):
+    """Axial (q, r) of the pointy-top hexagon of circumradius ``size`` holding each point."""
+    q = (_SQRT3 / 3 * x - y / 3) / size
+    r = 2 / 3 * y / size
+    # Cube rounding: fix the coordinate that moved most when rounding
+    s = -q - r
+    rq, rr, rs = np.rint(q), np.rint(r), np.rint(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rq = np.where(fix_q, -rr - rs, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+    return rq.astype(np.int64), rr.astype(np.int64)
+
+
+class HexBins:
+    """
+    Point values aggregated into hexagons: one entry per occupied cell.
+
+    ``count`` is the number of finite values in a cell and ``unreachable``
+    the number of inf/NaN ones; ``mean``, ``min`` and ``max`` cover the
+    finite values only (NaN for cells without any).
+    """
+
+    def __init__(self, q, r, size_m, origin, count, unreachable, total, low, high):
+        self.q, self.r = q, r
+        self.size_m = size_m
+        self.origin = origin
+        self.count = count
+        self.unreachable = unreachable
+        self.total = total
+        self.low, self.high = low, high
+
+    def __len__(self):
+        return len(self.q)
+
+    @property
+    def mean(self):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.count > 0, self.total / self.count, np.nan)
+
+    @property
+    def min(self):
+        return np.where(self.count > 0, self.low, np.nan)
+
+    @property
+    def max(self):
+        return np.where(self.count > 0, self.high, np.nan)
+
+    def centres(self):
+        """Lon/lat of every cell centre."""
+        x = self.size_m * _SQRT3 * (self.q + self.r / 2)
+        y = self.size_m * 1.5 * self.r
+        return _unproject(x, y, self.origin)
+
+    def polygons(self):
+        """Closed lon/lat rings, shape (cells, 7, 2)."""
+        x = self.size_m * _SQRT3 * (self.q + self.r / 2)
+        y = self.size_m * 1.5 * self.r
+        angles = np.radians(30 + 60 * np.arange(7))
+        lon, lat = _unproject(x[:, None] + self.size_m * np.cos(angles),
+                              y[:, None] + self.size_m * np.sin(angles), self.origin)
+        return np.stack([lon, lat], axis=-1)
+
+    def subset(self, mask):
+        return HexBins(
+            self.q[mask], self.r[mask], self.size_m, self.origin, self.count[mask],
+            self.unreachable[mask], self.total[mask], self.low[mask], self.high[mask]
+        )
+
+    def to_geojson(self, colors=None, precision=5, digits=1):
+        """
+        Compact GeoJSON FeatureCollection, one hexagon per cell.
+
+        Properties are count, unreachable and the rounded mean/min/max, plus
+        ``rgb`` when per-cell ``colors`` (cells x 3) are given.
+        """
+        rings = np.round(self.polygons(), precision).tolist()
+        stats = [np.round(v, digits) for v in (self.mean, self.min, self.max)]
+        stats = [np.where(np.isnan(v), None, v).tolist() for v in stats]
+        features = []
+        for i, ring in enumerate(rings):
+            props = {
+                "count": int(self.count[i]), "unreachable": int(self.unreachable[i]),
+                "mean": stats[0][i], "min": stats[1][i], "max": stats[2][i],
+            }
+            if colors is not None:
+                props["rgb"] = [int(c) for c in colors[i]]
+            features.append({"type": "Feature", "geometry": {"type": "Polygon", "coordinates": [ring]},
+                             "properties": props})
+        return {"type": "FeatureCollection", "features": features}
+
+
+def _aggregate(x, y, values, size, origin):
+    q, r = hex_cells(x, y, size)
+    if not len(q):
+        empty = np.zeros(0)
+        return HexBins(q, r, size, origin, q, q, empty, empty, empty)
+    finite = np.isfinite(values)
+    keys = (q - q.min()) * (r.max() - r.min() + 1) + (r - r.min())
+    unique, first, cell = np.unique(keys, return_index=True, return_inverse=True)
+    n = len(unique)
+    v = np.where(finite, values, 0.0)
+    low = np.full(n, np.inf)
+    high = np.full(n, -np.inf)
+    np.minimum.at(low, cell[finite], values[finite])
+    np.maximum.at(high, cell[finite], values[finite])
+    return HexBins(
+        q[first], r[first], size, origin,
+        count=np.bincount(cell, weights=finite, minlength=n).astype(np.int64),
+        unreachable=np.bincount(cell, weights=~finite, minlength=n).astype(np.int64),
+        total=np.bincount(cell, weights=v, minlength=n), low=low, high=high,
+    )
+
+
+def hex_bins(lon, lat, values, size_m=None, max_bins=MAX_BINS, origin=None):
+    """
+    Aggregate point values into hexagons of ``size_m`` metres (circumradius).
+
+    Without ``size_m`` the cells are sized from the points' extent and grown
+    until at most ``max_bins`` cells are occupied, so the output stays
+    bounded whatever the number of points.
+    """
+    lon, lat = np.asarray(lon, dtype=np.float64), np.asarray(lat, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    if origin is None:
+        origin = (float(lon.min()), float(lat.min())) if len(lon) else (0.0, 0.0)
+    x, y = _project(lon, lat, origin)
+    if size_m is not None or not len(x):
+        return _aggregate(x, y, values, size_m or 1.0, origin)
+
+    # Cells of equal area tiling the bounding box, then coarser until few enough are occupied
+    area = max(np.ptp(x) * np.ptp(y), 1.0)
+    size = max(np.sqrt(2 * area / (3 * _SQRT3 * max_bins)), 1.0)
+    bins = _aggregate(x, y, values, size, origin)
+    while len(bins) > max_bins:
+        size *= max(np.sqrt(len(bins) / max_bins), 1.05)
+        bins = _aggregate(x, y, values, size, origin)
+    return bins
+
+
+def value_colors(values, bands=None):
+    """
+    RGB per value: by band with ``bands``, else a green-to-red ramp between
+    the 5th and 95th percentiles. NaN values get grey.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    ok = np.isfinite(values)
+    colors = np.full((len(values), 3), 160, dtype=np.int64)
+    if not ok.any():
+        return colors
+    if bands is not None:
+        band = np.searchsorted(np.asarray(bands, dtype=np.float64), values[ok], side="left")
+        colors[ok] = np.asarray(BAND_COLORS)[np.minimum(band, len(BAND_COLORS) - 1)]
+        return colors
+    lo, hi = np.percentile(values[ok], [5, 95])
+    t = np.clip((values[ok] - lo) / (hi - lo if hi > lo else 1.0), 0, 1)[:, None]
+    ramp = np.asarray(BAND_COLORS, dtype=np.float64)
+    pos = t * (len(ramp) - 1)
+    i = np.minimum(pos.astype(np.int64), len(ramp) - 2)
+    colors[ok] = np.rint(ramp[i[:, 0]] + (pos - i) * (ramp[i[:, 0] + 1] - ramp[i[:, 0]])).astype(np.int64)
+    return colors
+
+
+def save_geojson(path, collection):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(collection, f, separators=(",", ":"))
+    return path
+
+
+def tile_index(lon, lat, zoom):
+    """Slippy-map (x, y) tile of each point at ``zoom``."""
+    n = 2 ** zoom
+    lat = np.radians(np.clip(lat, -85.0511, 85.0511))
+    x = np.floor((np.asarray(lon) + 180) / 360 * n).astype(np.int64)
+    y = np.floor((1 - np.arcsinh(np.tan(lat)) / np.pi) / 2 * n).astype(np.int64)
+    return np.clip(x, 0, n - 1), np.clip(y, 0, n - 1)
+
+
+def save_tiles(directory, lon, lat, values, zooms=(12, 14), tile_cells=TILE_CELLS, bands=None):
+    """
+    Tiled hexagon layers for full-network surfaces.
+
+    For each zoom the points are binned once with cells about
+    1/``tile_cells`` of a tile wide, and every cell is written to the
+    ``<zoom>/<x>/<y>.geojson`` tile holding its centre, so no tile exceeds
+    about ``tile_cells`` squared cells. ``index.json`` lists the tiles with
+    their cell counts.
+    """
+    lon, lat = np.asarray(lon, dtype=np.float64), np.asarray(lat, dtype=np.float64)
+    keep = np.isfinite(lon) & np.isfinite(lat)
+    lon, lat, values = lon[keep], lat[keep], np.asarray(values, dtype=np.float64)[keep]
+    origin = (float(lon.min()), float(lat.min())) if len(lon) else (0.0, 0.0)
+    index = {"zooms": list(zooms), "bands": list(bands) if bands is not None else None, "tiles": {}}
+    for zoom in zooms:
+        # Tile width in metres at the points' mean latitude
+        width = 2 * np.pi * EARTH_RADIUS_M * np.cos(np.radians(lat.mean() if len(lat) else 0)) / 2 ** zoom
+        bins = hex_bins(lon, lat, values, size_m=width / tile_cells / _SQRT3, origin=origin)
+        colors = value_colors(bins.mean, bands)
+        tx, ty = tile_index(*bins.centres(), zoom)
+        tiles = []
+        for key in np.unique(tx * 2 ** zoom + ty).tolist():
+            x, y = divmod(key, 2 ** zoom)
+            sel = (tx == x) & (ty == y)
+            path = os.path.join(directory, str(zoom), str(x), f"{y}.geojson")
+            save_geojson(path, bins.subset(sel).to_geojson(colors[sel]))
+            tiles.append({"x": x, "y": y, "cells": int(sel.sum())})
+        index["tiles"][str(zoom)] = tiles
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "index.json"), "w") as f:
+        json.dump(index, f, indent=2)
+    return directory
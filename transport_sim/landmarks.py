@@ -0,0 +1,275 @@
+import math
+import heapq
+import numpy as np
+from scipy.sparse.csgraph import connected_components
+from transport_sim.graph_cache import CompiledGraph, attached_index
+from transport_sim.routing import ShortestPathTree, TRAFFIC_MODES, MULTIMODAL_MODES
+from transport_sim.spatial_index import EARTH_RADIUS_M
+
+NUM_LANDMARKS = 8
+# Landmarks consulted per query: the ones giving the tightest bound at the source
+ACTIVE_LANDMARKS = 6
+# Stands in for infinity so bound arithmetic never produces NaN
+UNREACHABLE = 1e300
+
+
+def _haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def geodesic_factor(cg, weights):
+    """
+    Largest c with weight >= c * great-circle length on every usable edge.
+
+    ``c`` times the straight-line distance is then an admissible, consistent
+    A* bound, even with scenario edges shorter than the crow flies.
+    """
+    src, dst = cg.edge_sources(), np.asarray(cg.indices)
+    ok = np.isfinite(weights)
+    lat, lon = np.asarray(cg.y), np.asarray(cg.x)
+    geo = _haversine(lat[src[ok]], lon[src[ok]], lat[dst[ok]], lon[dst[ok]])
+    ratio = np.asarray(weights)[ok][geo > 0] / geo[geo > 0]
+    if len(ratio) == 0 or not np.isfinite(ratio.min()):
+        return 0.0
+    # Shave off rounding so the bound can never overestimate
+    return max(0.0, float(ratio.min()) * (1 - 1e-9))
+
+
+class LandmarkIndex:
+    """
+    ALT preprocessing for one graph and mode: routing costs between every
+    node and a few landmarks on the edge of the city.
+
+    By the triangle inequality ``|d(L, v) - d(L, t)|`` never overestimates
+    the cost from v to t, which steers A* straight at the target. Trees to
+    the landmarks are kept whole so a scenario overlay can patch them with
+    the routing engine's incremental updates instead of a rebuild.
+    """
+
+    def __init__(self, mode, landmarks, dist, pred, edge, from_dist=None, factor=0.0):
+        self.mode = mode
+        self.landmarks = landmarks
+        # Cost from every node to each landmark, one row per landmark
+        self.dist = dist
+        self.pred = pred
+        self.edge = edge
+        # Directed graphs also need the cost from each landmark to every node
+        self.from_dist = from_dist
+        self.factor = factor
+        self._rows = None
+
+    def trees(self, cg):
+        """The landmark trees as ShortestPathTrees over ``cg``."""
+        return [
+            ShortestPathTree(cg, root, self.dist[i], self.pred[i].astype(np.int64), self.edge[i])
+            for i, root in enumerate(self.landmarks)
+        ]
+
+    def node_rows(self):
+        # Per-node tuples of landmark costs, for cheap lookups inside the A* loop
+        if self._rows is None:
+            rows = [np.minimum(self.dist, UNREACHABLE).T.tolist()]
+            if self.from_dist is not None:
+                rows.append(np.minimum(self.from_dist, UNREACHABLE).T.tolist())
+            self._rows = rows
+        return self._rows
+
+    def heuristic(self, coords, source, target):
+        """
+        Lower bound on the cost from each node row to ``target`` as a function.
+
+        Combines the strongest landmarks for this pair with the geodesic bound;
+        ``coords`` are node latitudes and longitudes in radians, as lists.
+        """
+        rows = self.node_rows()
+        to = rows[0]
+        if self.from_dist is None:
+            gain = [abs(a - b) for a, b in zip(to[source], to[target])]
+        else:
+            frm = rows[1]
+            gain = [max(a - b, c - d) for a, b, c, d in zip(to[source], to[target], frm[target], frm[source])]
+        active = sorted(range(len(gain)), key=gain.__getitem__, reverse=True)[:ACTIVE_LANDMARKS]
+        t_to = [(i, to[target][i]) for i in active]
+        t_from = [(i, rows[1][target][i]) for i in active] if self.from_dist is not None else None
+
+        factor = self.factor
+        lat, lon = coords
+        lat_t, lon_t = lat[target], lon[target]
+        cos_t = math.cos(lat_t)
+        scale = 2 * EARTH_RADIUS_M * factor
+        memo = {}
+
+        def h(v):
+            if v in memo:
+                return memo[v]
+            r = to[v]
+            if t_from is None:
+                bound = max(abs(r[i] - t) for i, t in t_to)
+            else:
+                f = frm[v]
+                bound = max(
+                    max(r[i] - t for i, t in t_to),
+                    max(t - f[i] for i, t in t_from),
+                )
+            if factor > 0:
+                la = lat[v]
+                a = math.sin((lat_t - la) / 2) ** 2 + cos_t * math.cos(la) * math.sin((lon_t - lon[v]) / 2) ** 2
+                bound = max(bound, scale * math.asin(math.sqrt(min(a, 1.0))))
+            # Differences of rounded costs can overshoot by an ulp; stay below
+            bound *= 1 - 1e-12
+            memo[v] = bound
+            return bound
+
+        return h
+
+    def patched(self, router):
+        """
+        The index for a scenario overlay routed by ``router``.
+
+        Added and shortened edges make landmark costs drop, so the landmark
+        trees are updated incrementally from this index's own trees (never
+        through the routers' hub tree caches). Directed graphs are rebuilt
+        on the same landmarks.
+        """
+        base_router = router.base_router
+        if base_router is None or router.cg.directed:
+            return build_landmarks(router, self.mode, landmarks=self.landmarks)
+        trees = [router.updated_tree(tree, self.mode) for tree in self.trees(base_router.cg)]
+        weights = router.weights(self.mode)
+        return LandmarkIndex(
+            self.mode, self.landmarks,
+            np.stack([t.dist for t in trees]),
+            np.stack([t.pred for t in trees]).astype(np.int32),
+            np.stack([t.edge for t in trees]),
+            factor=geodesic_factor(router.cg, weights),
+        )
+
+
+def build_landmarks(router, mode, k=NUM_LANDMARKS, landmarks=None):
+    """
+    Choose ``k`` landmarks by farthest-point selection and search from them.
+
+    Each new landmark is the node farthest from all landmarks so far (within
+    reach), which spreads them around the edge of the city.
+    """
+    cg = router.cg
+    if landmarks is None:
+        # Start from the node farthest from one in the largest component
+        _, labels = connected_components(router.matrix(mode)[0], directed=cg.directed, connection="weak")
+        start = int(np.argmax(labels == np.argmax(np.bincount(labels))))
+        dist = router.search([start], mode, to_sources=True)[0][0]
+        chosen = []
+        nearest = np.where(np.isfinite(dist), dist, -1.0)
+        for _ in range(min(k, cg.n_nodes)):
+            row = int(np.argmax(nearest))
+            chosen.append(row)
+            d = router.search([row], mode, to_sources=True)[0][0]
+            nearest = np.minimum(nearest, np.where(np.isfinite(d), d, -1.0))
+            nearest[chosen] = -1.0
+        landmarks = cg.node_ids[chosen].tolist()
+
+    rows = cg.index_of(landmarks)
+    dist, pred, edge = router.search(rows, mode, to_sources=True)
+    from_dist = router.search(rows, mode)[0] if cg.directed else None
+    return LandmarkIndex(
+        mode, list(landmarks), dist, pred.astype(np.int32), edge, from_dist,
+        factor=geodesic_factor(cg, router.weights(mode)),
+    )
+
+
+def landmark_index(router, mode):
+    """
+    The LandmarkIndex for a router's graph and mode, built at most once.
+
+    Cached city graphs persist it next to their arrays; overlays patch their
+    base graph's index. Traffic-scaled costs get their own in-memory index.
+    """
+    key = f"landmarks_{mode}"
+    if key not in router.indexes:
+        if router.traffic is not None and mode in TRAFFIC_MODES and router.base_router is None:
+            index = build_landmarks(router, mode)
+        elif isinstance(router.cg, CompiledGraph):
+            index = attached_index(router.cg, key, lambda cg: build_landmarks(router, mode))
+        elif router.base_router is not None:
+            index = landmark_index(router.base_router, mode).patched(router)
+        else:
+            index = build_landmarks(router, mode)
+        router.indexes[key] = index
+    return router.indexes[key]
+
+
+def _adjacency(router, mode):
+    # Plain lists of the cheapest-edge CSR matrix: fastest to walk from Python
+    key = f"adjacency_{mode}"
+    if key not in router.indexes:
+        matrix, entry_edges = router.matrix(mode)
+        router.indexes[key] = (
+            matrix.indptr.tolist(), matrix.indices.tolist(), matrix.data.tolist(), entry_edges.tolist()
+        )
+    return router.indexes[key]
+
+
+def _coords(router):
+    if "coords" not in router.indexes:
+        cg = router.cg
+        router.indexes["coords"] = (np.radians(np.asarray(cg.y)).tolist(), np.radians(np.asarray(cg.x)).tolist())
+    return router.indexes["coords"]
+
+
+def point_to_point(router, source, target, mode="walk"):
+    """
+    Least-cost route from ``source`` to ``target`` with ALT A*.
+
+    Returns (node ids, metres), or ([], inf) when the target is unreachable.
+    Only the corridor between the two nodes is explored, so no tree has to
+    be grown from either end. Multimodal modes have no geometric bound on
+    their layered graph and read the route off the target's tree instead.
+    """
+    if mode in MULTIMODAL_MODES:
+        tree = router.tree(target, mode)
+        if not tree.is_reachable(source):
+            return [], float("inf")
+        return tree.route(source), float(tree.distance(source))
+    cg = router.cg
+    s, t = cg.index_of([source, target]).tolist()
+    index = landmark_index(router, mode)
+    h = index.heuristic(_coords(router), s, t)
+    if h(s) >= UNREACHABLE / 2:
+        return [], float("inf")
+    indptr, indices, weights, entry_edges = _adjacency(router, mode)
+
+    g = {s: 0.0}
+    via = {s: (-1, -1)}
+    closed = set()
+    # Ties go to the node nearer the target
+    heap = [(h(s), h(s), s)]
+    while heap:
+        _, _, u = heapq.heappop(heap)
+        if u in closed:
+            continue
+        if u == t:
+            break
+        closed.add(u)
+        gu = g[u]
+        for j in range(indptr[u], indptr[u + 1]):
+            v = indices[j]
+            nd = gu + weights[j]
+            if nd < g.get(v, float("inf")):
+                hv = h(v)
+                if hv >= UNREACHABLE / 2:
+                    continue
+                g[v] = nd
+                via[v] = (u, entry_edges[j])
+                heapq.heappush(heap, (nd + hv, hv, v))
+    else:
+        return [], float("inf")
+
+    lengths = cg.length
+    rows, metres = [t], 0.0
+    while rows[-1] != s:
+        u, e = via[rows[-1]]
+        metres += float(lengths[e])
+        rows.append(u)
+    return cg.node_ids[rows[::-1]].tolist(), metres
@@ -0,0 +1,59 @@
+import numpy as np
+
+# Routing penalties (seconds) for getting on and off a tram: the mean wait at
+# the stop and the time to step off and find the way on foot
+BOARDING_PENALTY_S = 300.0
+ALIGHTING_PENALTY_S = 30.0
+
+
+class MultimodalGraph:
+    """
+    Walk-tram-walk routing graph layered over a compiled city graph.
+
+    Row i < n_base is node i on foot; rows from n_base up are the tram
+    stops (nodes touching a tram edge) on board. Streets join walk rows
+    only, and every tram edge u->v appears four times: ridden between
+    stops (tram u -> tram v), boarded at u (walk u -> tram v), alighted at
+    v (tram u -> walk v), or both for a one-stop ride (walk u -> walk v).
+    Boarding and alighting penalties are folded into those edges, so every
+    layered edge is exactly one edge of the city graph (``edge``) and a
+    single search from a walk row yields the best combined trip.
+
+    ``weights`` is the per-edge cost of moving along the city graph
+    (mode_weights(cg, "tram"): walking seconds on streets, riding seconds
+    on tram edges); edges with infinite weight are left out.
+    """
+
+    def __init__(self, cg, weights, boarding=BOARDING_PENALTY_S, alighting=ALIGHTING_PENALTY_S):
+        self.base = cg
+        self.directed = True
+        n = cg.n_nodes
+        weights = np.asarray(weights, dtype=np.float64)
+        src, dst = cg.edge_sources(), np.asarray(cg.indices)
+        tram = np.asarray(cg.tram, dtype=bool)
+        usable = np.isfinite(weights)
+
+        streets = np.flatnonzero(usable & ~tram)
+        rails = np.flatnonzero(usable & tram)
+        self.stops = np.unique(np.r_[src[rails], dst[rails]])
+        # Tram-layer row of every stop; -1 for nodes off the tram network
+        on_board = np.full(n, -1, dtype=np.int64)
+        on_board[self.stops] = n + np.arange(len(self.stops))
+        self.n_base = n
+        self.n_nodes = n + len(self.stops)
+        self.node_rows = np.r_[np.arange(n, dtype=np.int64), self.stops]
+
+        u, v, ride = src[rails], dst[rails], weights[rails]
+        self.src = np.concatenate([src[streets], on_board[u], u, on_board[u], u])
+        self.indices = np.concatenate([dst[streets], on_board[v], on_board[v], v, v])
+        self.edge = np.concatenate([streets, rails, rails, rails, rails])
+        self.weights = np.concatenate([
+            weights[streets], ride, boarding + ride, ride + alighting, boarding + ride + alighting
+        ])
+
+    @property
+    def n_edges(self):
+        return len(self.edge)
+
+    def edge_sources(self):
+        return self.src
@@ -0,0 +1,142 @@
+import os
+import json
+import shutil
+import numpy as np
+import scipy.sparse as sp
+from transport_sim.routing import path_sum
+
+# Budget for one chunk of search results (dist, pred and edge rows)
+CHUNK_BYTES = 256 * 2**20
+
+
+def _as_rows(router, nodes):
+    return np.atleast_1d(router.cg.index_of(np.atleast_1d(nodes)))
+
+
+def od_chunks(router, origins, destinations, mode="walk", cutoff=None, metric="length", chunk_size=None):
+    """
+    Yield an origin-destination distance matrix in blocks.
+
+    Each item is ``(rows, cols, block)``: ``block[i, j]`` is the distance from
+    ``origins[rows][i]`` to ``destinations[cols][j]`` (inf if unreachable or
+    beyond ``cutoff``). ``metric`` is "length" for metres along the
+    least-cost path, as in agent distances, or "cost" for the mode's routing
+    cost; ``cutoff`` is always in routing cost (metres for walking).
+
+    Searches run from whichever side is smaller, several sources per batched
+    Dijkstra call, so memory stays bounded by ``chunk_size`` sources.
+    """
+    origins = _as_rows(router, origins)
+    destinations = _as_rows(router, destinations)
+    # From the destinations, search towards them so directed graphs stay correct
+    from_destinations = len(destinations) < len(origins)
+    sources, targets = (destinations, origins) if from_destinations else (origins, destinations)
+
+    n = router.cg.n_nodes
+    if chunk_size is None:
+        chunk_size = max(1, CHUNK_BYTES // (40 * n))
+    # scipy stops *before* the limit; the cutoff itself is still in range
+    limit = np.inf if cutoff is None else np.nextafter(cutoff, np.inf)
+    lengths = np.asarray(router.cg.length, dtype=np.float64)
+
+    for start in range(0, len(sources), chunk_size):
+        chunk = slice(start, min(start + chunk_size, len(sources)))
+        dist, pred, edge = router.search(sources[chunk], mode, to_sources=from_destinations, limit=limit)
+        if metric == "length":
+            values = path_sum(pred, np.where(edge >= 0, lengths[np.maximum(edge, 0)], 0.0))
+            values[~np.isfinite(dist)] = np.inf
+        elif metric == "cost":
+            values = dist
+        else:
+            raise ValueError(f"Unknown metric: {metric}")
+
+        block = values[:, targets]
+        if from_destinations:
+            yield slice(0, len(origins)), chunk, block.T
+        else:
+            yield chunk, slice(0, len(destinations)), block
+
+
+def od_matrix(router, origins, destinations, mode="walk", cutoff=None, metric="length",
+              sparse=False, chunk_size=None):
+    """
+    Full origin-destination matrix as a dense array (inf = unreachable).
+
+    With ``sparse`` only reachable pairs within ``cutoff`` are stored, as a
+    scipy CSR matrix; zero distances are kept as explicit entries.
+    """
+    chunks = od_chunks(router, origins, destinations, mode, cutoff, metric, chunk_size)
+    shape = (len(np.atleast_1d(origins)), len(np.atleast_1d(destinations)))
+    if not sparse:
+        matrix = np.full(shape, np.inf)
+        for rows, cols, block in chunks:
+            matrix[rows, cols] = block
+        return matrix
+
+    row_ids, col_ids, data = [], [], []
+    for rows, cols, block in chunks:
+        i, j = np.nonzero(np.isfinite(block))
+        row_ids.append(i + rows.start)
+        col_ids.append(j + cols.start)
+        data.append(block[i, j])
+    coo = sp.coo_matrix(
+        (np.concatenate(data or [[]]), (np.concatenate(row_ids or [[]]), np.concatenate(col_ids or [[]]))),
+        shape=shape
+    )
+    return coo.tocsr()
+
+
+def save_od_matrix(path, router, origins, destinations, mode="walk", cutoff=None, metric="length",
+                   chunk_size=None):
+    """
+    Compute a dense OD matrix straight into ``path/matrix.npy`` chunk by chunk.
+
+    The matrix never has to fit in memory; ``load_od_matrix`` memory-maps it
+    back together with the origin and destination node ids.
+    """
+    tmp = path + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    origins = np.atleast_1d(np.asarray(origins, dtype=np.int64))
+    destinations = np.atleast_1d(np.asarray(destinations, dtype=np.int64))
+    np.save(os.path.join(tmp, "origins.npy"), origins)
+    np.save(os.path.join(tmp, "destinations.npy"), destinations)
+    matrix = np.lib.format.open_memmap(
+        os.path.join(tmp, "matrix.npy"), mode="w+", dtype=np.float64,
+        shape=(len(origins), len(destinations))
+    )
+    for rows, cols, block in od_chunks(router, origins, destinations, mode, cutoff, metric, chunk_size):
+        matrix[rows, cols] = block
+    matrix.flush()
+    del matrix
+
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump({"mode": mode, "cutoff": cutoff, "metric": metric}, f)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+    return path
+
+
+def load_od_matrix(path, mmap=True):
+    """Return (matrix, origins, destinations, meta) saved by save_od_matrix."""
+    mmap_mode = "r" if mmap else None
+    matrix = np.load(os.path.join(path, "matrix.npy"), mmap_mode=mmap_mode)
+    origins = np.load(os.path.join(path, "origins.npy"))
+    destinations = np.load(os.path.join(path, "destinations.npy"))
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    return matrix, origins, destinations, meta
+
+
+def nearest_destination(router, nodes, destinations, mode="walk"):
+    """
+    Nearest destination for each node and the metres to it, from one
+    multi-source search. Unreachable nodes get -1 and inf.
+    """
+    forest = router.forest(destinations, mode)
+    rows = _as_rows(router, nodes)
+    ok = np.isfinite(forest.dist[rows])
+    nearest = np.full(len(rows), -1, dtype=np.int64)
+    nearest[ok] = router.cg.node_ids[forest.source[rows[ok]]]
+    return nearest, np.where(ok, forest.length[rows], np.inf)
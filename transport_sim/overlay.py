@@ -0,0 +1,178 @@
+import numpy as np
+from transport_sim.graph_cache import compile_arrays
+
+
+class ScenarioOverlay:
+    """
+    A scenario expressed as a small delta on top of an immutable base graph.
+
+    Added edges are appended after the base edges (edge ids ``>= base.n_edges``),
+    removed base edges are masked out and reweighted base edges get a new
+    length. The base arrays are never copied or modified, so any number of
+    overlays can share one loaded city graph; building one costs O(delta).
+
+    An overlay exposes the same node and edge arrays as a CompiledGraph, so
+    the routing engine reads straight through it.
+    """
+
+    def __init__(self, base):
+        self.base = base
+        self._added = []
+        self._removed = set()
+        self._lengths = {}
+        self._arrays = None
+
+    # --- Node attributes are the base graph's ---
+
+    @property
+    def node_ids(self):
+        return self.base.node_ids
+
+    @property
+    def x(self):
+        return self.base.x
+
+    @property
+    def y(self):
+        return self.base.y
+
+    @property
+    def n_nodes(self):
+        return self.base.n_nodes
+
+    @property
+    def directed(self):
+        return self.base.directed
+
+    @property
+    def highway_classes(self):
+        return self.base.highway_classes
+
+    def is_directed(self):
+        return self.directed
+
+    def index_of(self, node_ids):
+        return self.base.index_of(node_ids)
+
+    # --- Delta ---
+
+    def add_edge(self, u, v, length=1, tram=False, highway=None, speed_kph=None):
+        """Add an edge (both directions unless the base graph is directed)."""
+        code = self.base.highway_classes.index(highway) if highway in self.base.highway_classes else 0
+        speed = np.nan if speed_kph is None else float(speed_kph)
+        rows = self.index_of([u, v]).tolist()
+        self._added.append((rows[0], rows[1], float(length), code, speed, bool(tram)))
+        if not self.directed:
+            self._added.append((rows[1], rows[0], float(length), code, speed, bool(tram)))
+        self._arrays = None
+
+    def _base_edges(self, u, v):
+        ru, rv = self.index_of([u, v]).tolist()
+        start, end = self.base.indptr[ru], self.base.indptr[ru + 1]
+        edges = start + np.flatnonzero(np.asarray(self.base.indices[start:end]) == rv)
+        if not self.directed:
+            start, end = self.base.indptr[rv], self.base.indptr[rv + 1]
+            edges = np.r_[edges, start + np.flatnonzero(np.asarray(self.base.indices[start:end]) == ru)]
+        return edges.tolist()
+
+    def remove_edge(self, u, v):
+        """Hide every base edge between u and v."""
+        edges = self._base_edges(u, v)
+        if not edges:
+            raise KeyError(f"No edge between {u} and {v} in the base graph.")
+        self._removed.update(edges)
+        self._arrays = None
+
+    def set_length(self, u, v, length):
+        """Reweight every base edge between u and v."""
+        edges = self._base_edges(u, v)
+        if not edges:
+            raise KeyError(f"No edge between {u} and {v} in the base graph.")
+        self._lengths.update((e, float(length)) for e in edges)
+        self._arrays = None
+
+    @property
+    def n_added(self):
+        return len(self._added)
+
+    # --- Edge arrays read through by the routing engine ---
+
+    def _materialize(self):
+        if self._arrays is None:
+            base = self.base
+            added = list(zip(*self._added)) if self._added else [[]] * 6
+            src, dst, length, highway, speed, tram = (np.asarray(a) for a in added)
+
+            lengths = np.concatenate([np.asarray(base.length, dtype=np.float64), length.astype(np.float64)])
+            trams = np.concatenate([np.asarray(base.tram, dtype=bool), tram.astype(bool)])
+            if self._lengths:
+                edges = np.fromiter(self._lengths.keys(), dtype=np.int64)
+                lengths[edges] = np.fromiter(self._lengths.values(), dtype=np.float64)
+            if self._removed:
+                # An infinite length and no tram flag makes the edge unusable by every mode
+                edges = np.fromiter(self._removed, dtype=np.int64)
+                lengths[edges] = np.inf
+                trams[edges] = False
+
+            self._arrays = {
+                "sources": np.concatenate([base.edge_sources(), src.astype(np.int64)]),
+                "indices": np.concatenate([np.asarray(base.indices), dst.astype(np.int64)]),
+                "length": lengths,
+                "highway": np.concatenate([np.asarray(base.highway), highway.astype(np.int16)]),
+                "speed_kph": np.concatenate([np.asarray(base.speed_kph), speed.astype(np.float64)]),
+                "tram": trams,
+            }
+        return self._arrays
+
+    @property
+    def n_edges(self):
+        return self.base.n_edges + len(self._added)
+
+    def edge_sources(self):
+        return self._materialize()["sources"]
+
+    @property
+    def indices(self):
+        return self._materialize()["indices"]
+
+    @property
+    def length(self):
+        return self._materialize()["length"]
+
+    @property
+    def highway(self):
+        return self._materialize()["highway"]
+
+    @property
+    def speed_kph(self):
+        return self._materialize()["speed_kph"]
+
+    @property
+    def tram(self):
+        return self._materialize()["tram"]
+
+    def to_compiled(self):
+        """Flatten into a standalone CompiledGraph (copies the base arrays)."""
+        a = self._materialize()
+        keep = np.isfinite(a["length"])
+        return compile_arrays(
+            np.asarray(self.node_ids), np.asarray(self.x), np.asarray(self.y),
+            a["sources"][keep], a["indices"][keep], a["length"][keep], a["highway"][keep],
+            a["speed_kph"][keep], a["tram"][keep], self.highway_classes, self.directed
+        )
+
+
+def add_tramline(graph, stop_nodes, length=300):
+    """
+    Join consecutive stops with tram edges in both directions.
+
+    Works on a ScenarioOverlay or a NetworkX graph. A None entry (a stop
+    that could not be snapped) breaks the line: no edge is added to or
+    from it.
+    """
+    for u, v in zip(stop_nodes, stop_nodes[1:]):
+        if u is None or v is None:
+            continue
+        graph.add_edge(u, v, length=length, tram=True)
+        if graph.is_directed():
+            graph.add_edge(v, u, length=length, tram=True)
@@ -0,0 +1,198 @@
+import numpy as np
+from transport_sim.city_loader import tram_coords_lookup
+from transport_sim.overlay import ScenarioOverlay
+from transport_sim.population import AgentPopulation, MODES, ACTIVE, UNREACHABLE
+from transport_sim.multimodal import BOARDING_PENALTY_S, ALIGHTING_PENALTY_S
+from transport_sim.routing import mode_weights, MULTIMODAL_MODES
+from transport_sim.spatial_index import spatial_index
+
+
+def edge_cost_line(cg, u, v, mode):
+    """(intercept, slope) of a mode's cost for a tram edge u-v as a function of its length."""
+    costs = []
+    for length in (1.0, 2.0):
+        overlay = ScenarioOverlay(cg)
+        overlay.add_edge(u, v, length=length, tram=True)
+        costs.append(float(mode_weights(overlay, mode)[-1]))
+    intercept, slope = 2 * costs[0] - costs[1], costs[1] - costs[0]
+    if mode in MULTIMODAL_MODES:
+        # Riding the new edge means boarding at one end and alighting at the other
+        intercept += BOARDING_PENALTY_S + ALIGHTING_PENALTY_S
+    return intercept, slope
+
+
+class EdgeLengthSweep:
+    """
+    Agent distances as a function of the length of one added tram edge.
+
+    A shortest path uses the new edge u-v at most once, so for every node
+    the cost to the hub is ``min(base, via + slope * length)``: ``base``
+    comes from the baseline tree rooted at the hub, ``via`` from the trees
+    rooted at u and v. Each agent therefore switches onto the edge below
+    one threshold length, and any number of lengths is evaluated with array
+    arithmetic instead of one routing run per length.
+
+    ``agents`` is an unrouted AgentPopulation as drawn by draw_population;
+    ``router`` routes the base graph (without the edge). Tram trips are
+    exact while the edge is the only tram edge, since a ride on it then
+    always starts and ends on foot.
+    """
+
+    def __init__(self, router, hub, u, v, agents):
+        self.router = router
+        self.hub = hub
+        self.u, self.v = u, v
+        self.agents = agents
+        self._nodes = {}
+
+        # Agents' modes and reachability do not depend on the edge length
+        home = router.cg.index_of(agents.home_node)
+        self.mode = mode = agents.mode.copy()
+
+        self.reachable = np.zeros(len(agents), dtype=bool)
+        self.threshold = np.full(len(agents), -np.inf)
+        self.base_length = np.zeros(len(agents))
+        self.via_length = np.zeros(len(agents))
+        for code in np.unique(mode).tolist():
+            idx = np.flatnonzero(mode == code)
+            f = self.node_function(MODES[code])
+            rows = home[idx]
+            self.reachable[idx] = f["reachable"][rows]
+            self.threshold[idx] = f["threshold"][rows]
+            self.base_length[idx] = f["base_length"][rows]
+            self.via_length[idx] = f["via_length"][rows]
+
+    @classmethod
+    def from_scenario(cls, router, hub, scenario, agents):
+        """Build from a tramline_extension scenario with exactly two stops."""
+        stops = scenario.get("tram_stops", [])
+        if len(stops) != 2:
+            raise ValueError("A length sweep needs a scenario with exactly one tram edge (two stops).")
+        if not all(s in tram_coords_lookup for s in stops):
+            raise ValueError("Tram stop names not found in lookup.")
+        lats, lons = zip(*(tram_coords_lookup[s] for s in stops))
+        u, v = spatial_index(router.cg).nearest(np.array(lats), np.array(lons)).tolist()
+        return cls(router, hub, u, v, agents)
+
+    def node_function(self, mode):
+        """
+        Per-node pieces of the distance function for one mode.
+
+        ``threshold`` is the edge length below which a node's best path to the
+        hub uses the edge (inf: always, -inf: never); ``via_length`` is the
+        metres of that path excluding the edge itself.
+        """
+        if mode not in self._nodes:
+            router, cg = self.router, self.router.cg
+            hub = router.tree(self.hub, mode)
+            ru, rv = cg.index_of([self.u, self.v]).tolist()
+
+            # Agent -> u -> v -> hub, or agent -> v -> u -> hub
+            to_u, to_v = router.tree(self.u, mode), router.tree(self.v, mode)
+            via_uv = to_u.dist + hub.dist[rv]
+            via_vu = to_v.dist + hub.dist[ru]
+            uv = via_uv <= via_vu
+            intercept, slope = edge_cost_line(cg, self.u, self.v, mode)
+            via_cost = np.where(uv, via_uv, via_vu) + intercept
+            via_length = np.where(uv, to_u.length + hub.length[rv], to_v.length + hub.length[ru])
+
+            # Strictly cheaper paths win, as in the routing engine
+            with np.errstate(invalid="ignore", divide="ignore"):
+                if slope > 0:
+                    threshold = (hub.dist - via_cost) / slope
+                else:
+                    threshold = np.where(via_cost < hub.dist, np.inf, -np.inf)
+            threshold = np.where(np.isfinite(via_cost), threshold, -np.inf)
+            threshold = np.where(np.isnan(threshold), -np.inf, threshold)
+
+            self._nodes[mode] = {
+                "reachable": np.isfinite(hub.dist) | np.isfinite(via_cost),
+                "threshold": threshold,
+                "base_length": hub.length,
+                "via_length": via_length,
+            }
+        return self._nodes[mode]
+
+    def uses_edge(self, lengths):
+        """Mask (lengths x agents) of agents routed over the edge at each length."""
+        lengths = np.atleast_1d(np.asarray(lengths, dtype=np.float64))
+        return self.reachable & (lengths[:, None] < self.threshold)
+
+    def distances(self, lengths):
+        """Agent distances in metres (lengths x agents); unreachable agents get 0."""
+        lengths = np.atleast_1d(np.asarray(lengths, dtype=np.float64))
+        via = self.uses_edge(lengths)
+        dist = np.where(via, self.via_length + lengths[:, None], self.base_length)
+        return np.where(self.reachable, dist, 0.0)
+
+    def population(self, length):
+        """The scenario's routed AgentPopulation for one edge length."""
+        a = self.agents
+        status = np.where(self.reachable, ACTIVE, UNREACHABLE)
+        return AgentPopulation(
+            a.home_node, self.mode.copy(), a.hub_node, ids=a.id, status=status,
+            distance=self.distances([length])[0]
+        )
+
+    def stats(self, lengths):
+        """compute_stats for each length."""
+        return [self.population(length).stats() for length in np.atleast_1d(lengths).tolist()]
+
+    def _pieces(self):
+        # Reachable agents sorted by threshold, with prefix sums of base metres
+        # and suffix sums of via metres: at length L the agents from
+        # searchsorted(threshold, L, "right") onwards use the edge
+        if not hasattr(self, "_sorted"):
+            ok = self.reachable
+            order = np.argsort(self.threshold[ok])
+            base = np.r_[0.0, np.cumsum(self.base_length[ok][order])]
+            via = np.r_[np.cumsum(self.via_length[ok][order][::-1])[::-1], 0.0]
+            self._sorted = self.threshold[ok][order], base, via
+        return self._sorted
+
+    def mean_distance(self, lengths):
+        """Average distance over reachable agents at each length, in O(log n) per length."""
+        lengths = np.atleast_1d(np.asarray(lengths, dtype=np.float64))
+        t, base, via = self._pieces()
+        n = len(t)
+        if n == 0:
+            return np.full(len(lengths), np.nan)
+        k = np.searchsorted(t, lengths, side="right")
+        return (base[k] + via[k] + (n - k) * lengths) / n
+
+    def break_even(self, baseline_avg, gain=0.0):
+        """
+        Edge lengths where the average gain over ``baseline_avg`` crosses ``gain``.
+
+        The average distance is piecewise linear in the length, with one piece
+        between consecutive agent thresholds, so every crossing is solved
+        exactly. The largest returned length is the longest edge that still
+        delivers the gain.
+        """
+        t, base, via = self._pieces()
+        n = len(t)
+        if n == 0:
+            return np.array([])
+
+        # Piece j starts at starts[j]; the target is crossed where offset == slope * length
+        starts = np.r_[0.0, np.unique(t[np.isfinite(t) & (t > 0)])]
+        k = np.searchsorted(t, starts, side="right")
+        offset = baseline_avg - gain - (base[k] + via[k]) / n
+        slope = (n - k) / n
+
+        # Gains within rounding of the target count as reaching it
+        tol = 1e-9 * max(1.0, abs(baseline_avg))
+        ends = np.r_[starts[1:], np.inf]
+        with np.errstate(invalid="ignore"):
+            at_start = offset - slope * starts
+            at_end = np.where(slope > 0, offset - slope * ends, offset)
+
+        crossings = []
+        for j in range(len(starts)):
+            if (at_start[j] > tol) != (at_end[j] > tol):
+                # Gain falls linearly within the piece
+                crossings.append(min(max(offset[j] / slope[j], starts[j]), ends[j]))
+            if j > 0 and (at_end[j - 1] > tol) != (at_start[j] > tol):
+                # Jumps where agents leave the edge
+                crossings.append(starts[j])
+        return np.unique(crossings)
@@ -0,0 +1,344 @@
+import numpy as np
+from transport_sim.stats import StatsAggregator
+
+MODES = ["drive", "cycle", "walk", "tram"]
+STATUSES = ["active", "unreachable"]
+
+ACTIVE = STATUSES.index("active")
+UNREACHABLE = STATUSES.index("unreachable")
+
+
+def mode_code(mode):
+    return MODES.index(mode)
+
+
+def mode_probabilities(agent_distribution):
+    """Normalised mode shares in MODES order."""
+    weights = np.array([agent_distribution.get(m, 0) for m in MODES], dtype=np.float64)
+
+    # Normalize weights (in case they don’t sum to 100)
+    total = weights.sum()
+    if total == 0:
+        raise ValueError("Agent distribution weights cannot all be zero.")
+    return weights / total
+
+
+def synthesize_population(node_ids, hub_node, num_agents, agent_distribution,
+                          rng=None, spawn_weights=None, tram_nodes=None):
+    """
+    Draw modes and home nodes for every agent in one vectorised call.
+
+    ``rng`` is a seed or numpy Generator. ``spawn_weights`` is an optional
+    per-node weight array aligned with ``node_ids`` (or a {node: weight}
+    dict), e.g. population density; homes are uniform over nodes without it.
+    Tram agents spawn on ``tram_nodes`` when given.
+    """
+    rng = np.random.default_rng(rng)
+    node_ids = np.asarray(node_ids, dtype=np.int64)
+
+    modes = rng.choice(len(MODES), size=num_agents, p=mode_probabilities(agent_distribution))
+
+    if spawn_weights is None:
+        homes = node_ids[rng.integers(0, len(node_ids), size=num_agents)]
+    else:
+        if isinstance(spawn_weights, dict):
+            spawn_weights = [spawn_weights.get(n, 0) for n in node_ids.tolist()]
+        p = np.asarray(spawn_weights, dtype=np.float64)
+        if len(p) != len(node_ids) or p.sum() <= 0:
+            raise ValueError("spawn_weights must give a positive weight to at least one node.")
+        homes = node_ids[rng.choice(len(node_ids), size=num_agents, p=p / p.sum())]
+
+    if tram_nodes:
+        # Spawn tram agents on or near tramline stops
+        tram = np.flatnonzero(modes == mode_code("tram"))
+        homes[tram] = rng.choice(np.asarray(tram_nodes, dtype=np.int64), size=len(tram))
+
+    return AgentPopulation(homes, modes, hub_node)
+
+
+class AgentView:
+    """Read-only Agent lookalike backed by one row of an AgentPopulation."""
+
+    def __init__(self, population, index):
+        self._pop = population
+        self._i = index
+
+    @property
+    def id(self):
+        return int(self._pop.id[self._i])
+
+    @property
+    def home_node(self):
+        return int(self._pop.home_node[self._i])
+
+    @property
+    def hub_node(self):
+        return int(self._pop.destination[self._i])
+
+    @property
+    def mode(self):
+        return MODES[self._pop.mode[self._i]]
+
+    @property
+    def status(self):
+        return STATUSES[self._pop.status[self._i]]
+
+    @property
+    def total_distance(self):
+        return float(self._pop.distance[self._i])
+
+    @property
+    def route(self):
+        return self._pop.route(self._i)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "home_node": self.home_node,
+            "hub_node": self.hub_node,
+            "mode": self.mode,
+            "status": self.status,
+            "distance": self.total_distance,
+            "route": self.route,
+        }
+
+
+class AgentPopulation:
+    """
+    Columnar store of agents: one NumPy array per attribute.
+
+    Modes and statuses are small integer codes into MODES and STATUSES.
+    Routes are not stored; they are read back from the routing engine's
+    shared trees on demand. Every agent heads for its ``destination`` node,
+    which is the hub unless designated or assigned by plan_routes.
+    """
+
+    def __init__(self, home_node, mode, hub_node, ids=None, status=None, distance=None, destination=None):
+        n = len(home_node)
+        self.home_node = np.asarray(home_node, dtype=np.int64)
+        self.mode = np.asarray(mode, dtype=np.int8)
+        self.hub_node = hub_node
+        if destination is None:
+            self.destination = np.full(n, -1 if hub_node is None else hub_node, dtype=np.int64)
+        else:
+            self.destination = np.asarray(destination, dtype=np.int64)
+        # Candidate destinations when agents were sent to the nearest one
+        self.destinations = None
+        self.id = np.arange(n, dtype=np.int64) if ids is None else np.asarray(ids, dtype=np.int64)
+        self.status = np.full(n, ACTIVE, dtype=np.int8) if status is None else np.asarray(status, dtype=np.int8)
+        self.distance = np.zeros(n, dtype=np.float64) if distance is None else np.asarray(distance, dtype=np.float64)
+        self.router = None
+
+    def __len__(self):
+        return len(self.id)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return AgentView(self, index)
+
+    def __iter__(self):
+        return (AgentView(self, i) for i in range(len(self)))
+
+    def mask(self, mode=None, status=None):
+        """Boolean mask of agents matching the given mode and/or status names."""
+        m = np.ones(len(self), dtype=bool)
+        if mode is not None:
+            m &= self.mode == mode_code(mode)
+        if status is not None:
+            m &= self.status == STATUSES.index(status)
+        return m
+
+    def copy(self):
+        """Independent copy, e.g. to route the same agents under another scenario."""
+        return self.subset(np.ones(len(self), dtype=bool))
+
+    def subset(self, mask):
+        sub = AgentPopulation(
+            self.home_node[mask], self.mode[mask], self.hub_node,
+            ids=self.id[mask], status=self.status[mask], distance=self.distance[mask],
+            destination=self.destination[mask]
+        )
+        sub.router = self.router
+        sub.destinations = self.destinations
+        return sub
+
+    def group_by_mode(self):
+        """Indices of agents for each mode present, in MODES order."""
+        order = np.argsort(self.mode, kind="stable")
+        codes, starts = np.unique(self.mode[order], return_index=True)
+        groups = np.split(order, starts[1:])
+        return {MODES[c]: g for c, g in zip(codes.tolist(), groups)}
+
+    def plan_routes(self, router, destinations=None):
+        """
+        Vectorised Agent.plan_route over the router's shortest-path trees.
+
+        Agents route to their own ``destination`` (one tree per destination
+        and mode). With ``destinations``, each agent instead heads for the
+        nearest of those nodes by its own mode, found with one multi-source
+        search per mode, and ``destination`` records the choice.
+        """
+        self.router = router
+        if destinations is not None:
+            self.destinations = tuple(sorted(set(np.atleast_1d(destinations).tolist())))
+        for code in range(len(MODES)):
+            idx = np.flatnonzero(self.mode == code)
+            if len(idx) == 0:
+                continue
+            # Tram trips may walk to a stop and on from another, in the same search
+            ok = self._route(router, idx, MODES[code])
+            # Re-planning resets agents that were unreachable under an earlier router
+            self.status[idx[ok]] = ACTIVE
+            self.status[idx[~ok]] = UNREACHABLE
+            self.distance[idx[~ok]] = 0
+
+    def _route(self, router, idx, mode):
+        # Distances for agents ``idx`` travelling by ``mode``; returns who is reachable
+        home = self.home_node[idx]
+        if self.destinations is not None:
+            forest = router.forest(self.destinations, mode)
+            rows = router.cg.index_of(home)
+            ok = np.isfinite(forest.dist[rows])
+            self.distance[idx[ok]] = forest.length[rows[ok]]
+            self.destination[idx[ok]] = router.cg.node_ids[forest.source[rows[ok]]]
+            return ok
+
+        ok = np.zeros(len(idx), dtype=bool)
+        for dest in np.unique(self.destination[idx]).tolist():
+            sel = np.flatnonzero(self.destination[idx] == dest)
+            tree = router.tree(dest, mode)
+            ok[sel] = tree.is_reachable(home[sel])
+            sel = sel[ok[sel]]
+            self.distance[idx[sel]] = tree.distance(home[sel])
+        return ok
+
+    def changed_from(self, other):
+        """Mask of agents whose mode, status or distance differs from ``other``.
+
+        Both populations must hold the same agents in the same order, e.g. a
+        baseline and a scenario run drawn with the same seed.
+        """
+        if len(other) != len(self) or np.any(other.home_node != self.home_node):
+            raise ValueError("Populations do not hold the same agents.")
+        return (
+            (self.mode != other.mode)
+            | (self.status != other.status)
+            | (self.destination != other.destination)
+            | ~np.isclose(self.distance, other.distance, rtol=0, atol=1e-9)
+        )
+
+    def route(self, index):
+        if self.router is None or self.status[index] != ACTIVE:
+            return []
+        mode = MODES[self.mode[index]]
+        if self.destinations is not None:
+            tree = self.router.forest(self.destinations, mode)
+        else:
+            tree = self.router.tree(int(self.destination[index]), mode)
+        return tree.route(int(self.home_node[index]))
+
+    def route_edges(self):
+        """
+        Every agent's route as graph edge indices, home to destination.
+
+        Returns (offsets, edges) in CSR form: agent i's edges are
+        ``edges[offsets[i]:offsets[i + 1]]``, read off the same trees as
+        plan_routes (on undirected graphs an edge may be stored in either
+        direction). Unrouted and unreachable agents have empty routes.
+        """
+        return self._walk_routes(nodes=False)
+
+    def route_nodes(self, rows=False):
+        """
+        Every agent's route as node ids, home to destination, in the same
+        CSR form as route_edges: one node more than edges per routed agent,
+        as in ``route(i)``. With ``rows`` the nodes are row indices into the
+        router graph's ``node_ids`` instead.
+        """
+        return self._walk_routes(nodes=True, rows=rows)
+
+    def _walk_routes(self, nodes, rows=False):
+        groups = []
+        if self.router is not None:
+            active = self.status == ACTIVE
+            for code in np.unique(self.mode[active]).tolist():
+                idx = np.flatnonzero(active & (self.mode == code))
+                mode = MODES[code]
+                if self.destinations is not None:
+                    groups.append((self.router.forest(self.destinations, mode), idx))
+                    continue
+                for dest in np.unique(self.destination[idx]).tolist():
+                    groups.append((self.router.tree(dest, mode), idx[self.destination[idx] == dest]))
+
+        hops = np.zeros(len(self), dtype=np.int64)
+        for tree, idx in groups:
+            hops[idx] = tree.path_sum(np.ones(len(tree.pred)))[tree.cg.index_of(self.home_node[idx])]
+        # A route of k edges visits k + 1 nodes
+        sizes = hops.copy()
+        if nodes:
+            for _, idx in groups:
+                sizes[idx] += 1
+
+        offsets = np.zeros(len(self) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+        out = np.empty(offsets[-1], dtype=np.int64)
+        for tree, idx in groups:
+            # Walk all of a tree's agents towards the root one edge at a time
+            row, pos, left = tree.cg.index_of(self.home_node[idx]), offsets[idx], hops[idx]
+            if nodes:
+                out[pos] = self._route_node(tree, row, rows)
+                pos = pos + 1
+            row, pos, left = row[left > 0], pos[left > 0], left[left > 0]
+            while len(row):
+                if nodes:
+                    out[pos] = self._route_node(tree, tree.pred[row], rows)
+                else:
+                    out[pos] = tree.edge[row]
+                row, pos, left = tree.pred[row], pos + 1, left - 1
+                more = left > 0
+                row, pos, left = row[more], pos[more], left[more]
+        return offsets, out
+
+    @staticmethod
+    def _route_node(tree, row, rows):
+        # Multimodal trees map their on-board rows back to city nodes
+        if tree.node_rows is not None:
+            row = tree.node_rows[row]
+        return row if rows else tree.cg.node_ids[row]
+
+    def aggregate(self):
+        """A StatsAggregator over this population, from one vectorised pass."""
+        return StatsAggregator(MODES).add(self.mode, self.status == ACTIVE, self.distance)
+
+    def stats(self):
+        """Same summary as compute_stats, with distance quantiles."""
+        stats = self.aggregate().to_dict()
+        if self.destinations is not None or np.any(self.destination != self.hub_node):
+            stats["destinations"] = self.by_destination()
+        return stats
+
+    def by_destination(self):
+        """Agent count and distance summary per destination node."""
+        result = {}
+        for dest in np.unique(self.destination).tolist():
+            idx = np.flatnonzero(self.destination == dest)
+            d = self.distance[idx[self.status[idx] == ACTIVE]]
+            result[dest] = {
+                "count": len(idx),
+                "reachable_count": len(d),
+                "avg_distance": float(d.mean()) if len(d) else None,
+                "max_distance": float(d.max()) if len(d) else None,
+            }
+        return result
+
+    def by_mode(self):
+        """Same summary as simulation.group_stats_by_mode."""
+        return self.aggregate().by_mode()
+
+    def home_distances(self):
+        """{home_node: distance} for active agents, as used by the access maps."""
+        active = self.status == ACTIVE
+        return dict(zip(self.home_node[active].tolist(), self.distance[active].tolist()))
@@ -0,0 +1,198 @@
+import os
+import csv
+import json
+import numpy as np
+from scipy import stats as st
+from transport_sim.city_loader import tram_coords_lookup
+from transport_sim.overlay import ScenarioOverlay, add_tramline
+from transport_sim.population import MODES, synthesize_population
+from transport_sim.routing import RoutingEngine
+from transport_sim.shared import share_router, attach_router, run_jobs
+from transport_sim.spatial_index import spatial_index
+from transport_sim.stats import StatsAggregator, QUANTILES
+
+DEFAULT_REPLICATIONS = 20
+
+
+def replication_seeds(seed, n):
+    """
+    ``n`` independent seeds derived deterministically from ``seed``.
+
+    Replication i always gets the same seed for the same base seed, however
+    many replications run and on however many processes.
+    """
+    return [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(n)]
+
+
+def scenario_stop_nodes(router, scenario):
+    """Snapped node of every stop of a tramline_extension scenario (None if unknown), like apply_scenario."""
+    stops = scenario.get("tram_stops", [])
+    known = [s for s in stops if s in tram_coords_lookup]
+    if not known:
+        return []
+    lats, lons = zip(*(tram_coords_lookup[s] for s in known))
+    snapped = dict(zip(known, spatial_index(router.cg).nearest(np.array(lats), np.array(lons)).tolist()))
+    return [snapped.get(s) for s in stops]
+
+
+def confidence_interval(values, confidence=0.95):
+    """(mean, half-width) of a Student-t interval; half-width is None below two values."""
+    values = np.asarray([v for v in values if v is not None], dtype=np.float64)
+    if len(values) == 0:
+        return None, None
+    mean = float(values.mean())
+    if len(values) < 2:
+        return mean, None
+    sem = values.std(ddof=1) / np.sqrt(len(values))
+    return mean, float(st.t.ppf(0.5 + confidence / 2, len(values) - 1) * sem)
+
+
+def metrics(stats):
+    """Flat {metric: value} of a stats dict: overall and per-mode distances and unreachable counts."""
+    keys = ["avg_distance", "unreachable"] + [f"p{int(q * 100)}_distance" for q in QUANTILES]
+    row = {k: stats[k] for k in keys}
+    for mode in MODES:
+        m = stats["modes"].get(mode, {})
+        row[f"{mode}_avg_distance"] = m.get("avg_distance")
+        row[f"{mode}_unreachable"] = m.get("unreachable")
+    return row
+
+
+# --- Worker side: state set up once per process by _setup ---
+
+_worker = {}
+
+def _setup(router, hub, tramline, population, destinations):
+    overlay = ScenarioOverlay(router.cg)
+    add_tramline(overlay, *tramline)
+    # Scenario trees are updated from the shared baseline trees once per worker
+    scenario_router = RoutingEngine(overlay, base_router=router, traffic=router.traffic)
+    _worker.update(
+        router=router, scenario_router=scenario_router, hub=hub,
+        population=population, destinations=destinations
+    )
+
+
+def _init_worker(router_spec, router_meta, *args):
+    router, _ = attach_router(router_spec, router_meta)
+    _setup(router, *args)
+
+
+def _replicate(job):
+    index, seed = job
+    router, hub = _worker["router"], _worker["hub"]
+    p = _worker["population"]
+    # Common random numbers: baseline and scenario route the same draw
+    agents = synthesize_population(
+        router.cg.node_ids, hub, p["num_agents"], p["agent_distribution"],
+        rng=seed, tram_nodes=p["tram_nodes"]
+    )
+    scenario = agents.copy()
+    agents.plan_routes(router, destinations=_worker["destinations"])
+    scenario.plan_routes(_worker["scenario_router"], destinations=_worker["destinations"])
+    changed = int(scenario.changed_from(agents).sum())
+    return index, seed, agents.aggregate(), scenario.aggregate(), changed
+
+
+def run_replications(router, hub, population, scenario, seed=0, replications=DEFAULT_REPLICATIONS,
+                     processes=None, confidence=0.95, destinations=None):
+    """
+    Run seeded baseline-versus-scenario replications in a process pool.
+
+    ``population`` holds ``num_agents``, ``agent_distribution`` and
+    ``tram_nodes``. Each replication draws its own agents from
+    ``replication_seeds(seed, replications)`` and routes the same agents
+    through the baseline and the tramline scenario, so per-replication gains
+    are paired and free of sampling noise between the two. The graph and
+    the baseline trees from the hub sit in shared memory once for all
+    workers; with ``processes == 1`` the replications run in this process
+    on ``router`` itself.
+
+    Returns per-replication metric rows, a summary of mean and confidence
+    interval per metric, and stats pooled over all replications.
+    """
+    seeds = replication_seeds(seed, replications)
+    jobs = list(enumerate(seeds))
+    args = (hub, (scenario_stop_nodes(router, scenario), scenario.get("length", 300)), population, destinations)
+
+    def share():
+        block, meta = share_router(router, [(hub, m) for m in MODES])
+        return (block.spec, meta) + args, [block]
+
+    results = run_jobs(_replicate, jobs, _worker, _setup, (router,) + args, _init_worker, share, processes=processes)
+
+    rows = []
+    pooled = {"baseline": StatsAggregator(MODES), "tramline": StatsAggregator(MODES)}
+    for index, rep_seed, baseline, tramline, changed in results:
+        pooled["baseline"].merge(baseline)
+        pooled["tramline"].merge(tramline)
+        before, after = metrics(baseline.to_dict()), metrics(tramline.to_dict())
+        row = {"replication": index, "seed": rep_seed, "changed_agents": changed}
+        for key in before:
+            row[f"baseline_{key}"] = before[key]
+            row[f"tramline_{key}"] = after[key]
+            if key.endswith("distance"):
+                row[f"gain_{key}"] = None if before[key] is None or after[key] is None else before[key] - after[key]
+        rows.append(row)
+
+    return {
+        "seed": seed,
+        "confidence": confidence,
+        "replications": rows,
+        "summary": summarize(rows, confidence),
+        "pooled": {name: agg.to_dict() for name, agg in pooled.items()},
+    }
+
+
+def summarize(rows, confidence=0.95):
+    """Mean, confidence interval and count for every metric column of the replication rows."""
+    summary = {}
+    for key in rows[0] if rows else []:
+        if key in ("replication", "seed"):
+            continue
+        values = [r[key] for r in rows]
+        mean, half = confidence_interval(values, confidence)
+        summary[key] = {
+            "mean": mean,
+            "ci_low": None if half is None else mean - half,
+            "ci_high": None if half is None else mean + half,
+            "n": sum(v is not None for v in values),
+        }
+    return summary
+
+
+def save_replications(result, directory, suffix=""):
+    """Write replications{suffix}.csv (one row per replication) and .json (summary and pooled stats)."""
+    os.makedirs(directory, exist_ok=True)
+    rows = result["replications"]
+    csv_path = os.path.join(directory, f"replications{suffix}.csv")
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else ["replication", "seed"])
+        writer.writeheader()
+        writer.writerows(rows)
+    json_path = os.path.join(directory, f"replications{suffix}.json")
+    with open(json_path, "w") as f:
+        json.dump({k: v for k, v in result.items() if k != "replications"}, f, indent=2)
+    return csv_path, json_path
+
+
+if __name__ == "__main__":
+    import sys
+    import argparse
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+    from transport_sim.simulation import load_config
+    from transport_sim.engine import get_engine
+
+    parser = argparse.ArgumentParser(description="Seeded baseline-vs-tramline replications with confidence intervals.")
+    parser.add_argument("config", nargs="?", default="transport_sim/config.json")
+    parser.add_argument("-n", "--replications", type=int, default=None)
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    result = get_engine().replicate(load_config(args.config), replications=args.replications,
+                                    processes=args.processes)
+    for key in ["gain_avg_distance"] + [f"gain_{m}_avg_distance" for m in MODES]:
+        s = result["summary"].get(key, {})
+        if s.get("mean") is not None:
+            ci = f"[{s['ci_low']:.1f}, {s['ci_high']:.1f}]" if s["ci_low"] is not None else ""
+            print(f"{key:<28} {s['mean']:8.1f} m {ci}")
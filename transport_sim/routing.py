@@ -0,0 +1,415 @@
+import heapq
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import dijkstra
+from transport_sim.graph_cache import CompiledGraph, compile_graph
+from transport_sim.movement import MODE_SPEEDS_KPH
+from transport_sim.multimodal import MultimodalGraph
+from transport_sim.overlay import ScenarioOverlay
+
+
+def as_compiled(graph):
+    """Accept a NetworkX graph, a CompiledGraph or a ScenarioOverlay."""
+    if isinstance(graph, (CompiledGraph, ScenarioOverlay)):
+        return graph
+    return compile_graph(graph)
+
+
+# Road classes that cyclists must not use
+CYCLE_FORBIDDEN = ["motorway", "trunk", "motorway_link"]
+
+# Modes whose costs are scaled by a traffic profile
+TRAFFIC_MODES = ["drive"]
+
+# Modes routed over a layered MultimodalGraph (walk to a stop, ride, walk on)
+MULTIMODAL_MODES = ["tram"]
+
+
+def mode_weights(cg, mode):
+    """
+    Vectorised form of Agent.get_weight: one cost per CSR edge for a mode.
+
+    Forbidden edges get infinity so the solver never relaxes them.
+    """
+    length = np.asarray(cg.length, dtype=np.float64)
+
+    if mode == "walk":
+        return length
+    elif mode == "cycle":
+        forbidden = np.isin(np.asarray(cg.highway), highway_codes(cg, CYCLE_FORBIDDEN))
+        return np.where(forbidden, np.inf, length * 1.1)
+    elif mode == "drive":
+        speed = np.asarray(cg.speed_kph, dtype=np.float64)
+        return length / np.where(np.isnan(speed), 30, speed)
+    elif mode == "tram":
+        # Seconds on foot or on board; stop penalties live in the MultimodalGraph
+        walk, ride = MODE_SPEEDS_KPH["walk"] / 3.6, MODE_SPEEDS_KPH["tram"] / 3.6
+        return np.where(np.asarray(cg.tram), length / ride, length / walk)
+
+    return length
+
+
+def highway_codes(cg, names):
+    return [cg.highway_classes.index(n) for n in names if n in cg.highway_classes]
+
+
+def weight_matrix(cg, weights, return_edges=False):
+    """
+    Build a scipy CSR matrix from per-edge weights in CSR order.
+
+    Edges with infinite weight are dropped and parallel edges collapse to
+    their cheapest entry, which is what NetworkX does for MultiGraphs. With
+    ``return_edges`` the CSR edge index behind every matrix entry is returned
+    as well.
+    """
+    src = cg.edge_sources()
+    dst = np.asarray(cg.indices)
+    weights = np.asarray(weights, dtype=np.float64)
+
+    edges = np.flatnonzero(np.isfinite(weights))
+    keys = src[edges] * cg.n_nodes + dst[edges]
+    if len(keys) and np.any(keys[1:] < keys[:-1]):
+        # Overlay edges are appended after the sorted base edges
+        edges = edges[np.argsort(keys, kind="stable")]
+    src, dst, weights = src[edges], dst[edges], weights[edges]
+
+    # Sorted by (src, dst) so parallel edges are adjacent
+    new_pair = np.ones(len(edges), dtype=bool)
+    new_pair[1:] = (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])
+    group = np.cumsum(new_pair) - 1
+    starts = np.flatnonzero(new_pair)
+
+    # Cheapest edge first within each (src, dst) group
+    order = np.lexsort((weights, group))[starts]
+    edges, src, dst, weights = edges[order], src[order], dst[order], weights[order]
+
+    indptr = np.zeros(cg.n_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=cg.n_nodes), out=indptr[1:])
+    # Explicit zero-length edges stay edges in a sparse csgraph input
+    matrix = sp.csr_matrix((weights, dst, indptr), shape=(cg.n_nodes, cg.n_nodes))
+    if return_edges:
+        return matrix, edges
+    return matrix
+
+
+def path_sum(pred, values):
+    """
+    Sum per-node tree-edge values along each node's path to its root.
+
+    ``pred`` is a predecessor array, or a 2-D stack of them with one row per
+    search; -1 marks roots and unreachable nodes.
+    """
+    pred = np.asarray(pred)
+    shape, n = pred.shape, pred.shape[-1]
+    pred = pred.reshape(-1, n)
+    # Flatten the rows into one forest so a single loop handles every search
+    offset = (np.arange(pred.shape[0], dtype=np.int64) * n)[:, None]
+    anc = np.where(pred >= 0, pred + offset, -1).ravel()
+    total = np.where(anc >= 0, np.asarray(values).ravel(), 0.0).astype(np.float64)
+    # Pointer jumping: O(n log depth) instead of a Python walk per node
+    live = anc >= 0
+    while live.any():
+        total[live] += total[anc[live]]
+        anc[live] = anc[anc[live]]
+        live = anc >= 0
+    return total.reshape(shape)
+
+
+class ShortestPathTree:
+    """
+    Distances and predecessors from a single root node to every node.
+
+    ``dist`` holds the routing cost for the mode, ``edge`` the CSR edge index
+    joining each node to its predecessor (-1 for the root and unreachable
+    nodes) and ``length`` the metres along the tree path to the root.
+
+    Trees of multimodal modes span a layered graph: rows past the city's
+    nodes are tram stops on board, and ``node_rows`` maps every row back to
+    its city node row. Node ids still look up the walking row.
+    """
+
+    def __init__(self, cg, root, dist, pred, edge, changed=None, length=None, source=None, node_rows=None):
+        self.cg = cg
+        self.root = root
+        self.node_rows = node_rows
+        # For a forest grown from several roots, the row of each node's root
+        self.source = source
+        self.dist = dist
+        self.pred = pred
+        self.edge = edge
+        # Rows whose distance improved, when the tree was updated incrementally
+        self.changed = changed
+        self.length = self.path_sum(np.asarray(cg.length)[edge]) if length is None else length
+
+    def path_sum(self, values):
+        """Sum per-node tree-edge values along each node's path to the root."""
+        return path_sum(self.pred, values)
+
+    def edge_flows(self, demand):
+        """
+        Agents crossing each CSR edge when every node sends ``demand`` agents
+        (one value per node row) along the tree to its root.
+
+        Subtree totals are accumulated level by level from the deepest nodes
+        up, so the cost is linear in the tree size rather than in the total
+        length of all routes.
+        """
+        pred = np.asarray(self.pred)
+        carried = np.zeros(len(pred))
+        carried[:len(demand)] = demand
+        nodes = np.flatnonzero(pred >= 0)
+        depth = self.path_sum((pred >= 0).astype(np.float64))[nodes].astype(np.int64)
+        order = np.argsort(-depth, kind="stable")
+        nodes, depth = nodes[order], depth[order]
+        bounds = np.r_[np.flatnonzero(np.r_[True, depth[1:] != depth[:-1]]), len(nodes)].tolist()
+        for a, b in zip(bounds[:-1], bounds[1:]):
+            level = nodes[a:b]
+            np.add.at(carried, pred[level], carried[level])
+        return np.bincount(self.edge[nodes], weights=carried[nodes], minlength=self.cg.n_edges)
+
+    def distance(self, node_ids):
+        """Metres along the tree path from each node to the root."""
+        return self.length[self.cg.index_of(node_ids)]
+
+    def cost(self, node_ids):
+        return self.dist[self.cg.index_of(node_ids)]
+
+    def is_reachable(self, node_ids):
+        return np.isfinite(self.cost(node_ids))
+
+    def route(self, node_id):
+        """Node ids from ``node_id`` back to the root, or [] if unreachable."""
+        row = int(self.cg.index_of(node_id))
+        if not np.isfinite(self.dist[row]):
+            return []
+        rows = [row]
+        while self.pred[row] >= 0:
+            row = int(self.pred[row])
+            rows.append(row)
+        if self.node_rows is not None:
+            rows = self.node_rows[rows]
+        return self.cg.node_ids[rows].tolist()
+
+
+class RoutingEngine:
+    """
+    Batched shortest-path routing against a fixed graph.
+
+    All agents share a destination hub, so one tree rooted at the hub answers
+    every agent's distance and route. Per-mode edge costs are compiled once
+    into NumPy vectors, and trees are computed once per hub and per mode and
+    cached for the lifetime of the engine. With ``traffic`` (a TrafficTime)
+    driving costs are scaled per edge; the graph itself is never modified.
+    ``free_flow`` is a router for the same graph without traffic, whose trees
+    are reused for the modes traffic does not affect. Tram trips are routed
+    over a MultimodalGraph, so one search covers walking to a stop, riding
+    and walking on.
+    """
+
+    def __init__(self, graph, base_router=None, traffic=None, free_flow=None):
+        self.cg = as_compiled(graph)
+        # Router for the overlay's base graph; its trees seed incremental updates
+        self.base_router = base_router
+        self.traffic = traffic
+        self.free_flow = free_flow
+        self.max_incremental = max(1000, self.cg.n_nodes // 20)
+        self._weights = {}
+        self._matrices = {}
+        self._entry_keys = {}
+        self._trees = {}
+        self._layers = {}
+        # Derived per-graph indexes, e.g. landmarks for point-to-point queries
+        self.indexes = {}
+
+    def weights(self, mode):
+        if mode not in self._weights:
+            weights = mode_weights(self.cg, mode)
+            if self.traffic is not None and mode in TRAFFIC_MODES:
+                weights = weights * self.traffic.multipliers(self.cg)
+            self._weights[mode] = weights
+        return self._weights[mode]
+
+    def layers(self, mode):
+        """The MultimodalGraph a multimodal mode is routed over, built once."""
+        if mode not in self._layers:
+            self._layers[mode] = MultimodalGraph(self.cg, self.weights(mode))
+        return self._layers[mode]
+
+    def node_rows(self, mode):
+        """City node row of every search row for a multimodal mode, else None."""
+        return self.layers(mode).node_rows if mode in MULTIMODAL_MODES else None
+
+    def matrix(self, mode):
+        if mode not in self._matrices:
+            if mode in MULTIMODAL_MODES:
+                # Matrix entries map back to the city edge each layered edge copies
+                layered = self.layers(mode)
+                matrix, entries = weight_matrix(layered, layered.weights, return_edges=True)
+                self._matrices[mode] = (matrix, layered.edge[entries])
+            else:
+                self._matrices[mode] = weight_matrix(self.cg, self.weights(mode), return_edges=True)
+        return self._matrices[mode]
+
+    def tree(self, root, mode="walk"):
+        if self.free_flow is not None and mode not in TRAFFIC_MODES:
+            return self.free_flow.tree(root, mode)
+        key = (root, mode)
+        if key not in self._trees:
+            tree = None
+            if self.base_router is not None:
+                tree = self._update(root, mode)
+            self._trees[key] = tree or self._solve(root, mode)
+        return self._trees[key]
+
+    def has_tree(self, root, mode="walk"):
+        if self.free_flow is not None and mode not in TRAFFIC_MODES:
+            return self.free_flow.has_tree(root, mode)
+        return (root, mode) in self._trees
+
+    def add_tree(self, tree, mode):
+        """Register a precomputed tree, e.g. one shared from another process."""
+        self._trees[(tree.root, mode)] = tree
+
+    def updated_tree(self, base_tree, mode="walk"):
+        """
+        This overlay's tree for the root of ``base_tree``, a tree over the base
+        router's graph, grown from it incrementally where possible.
+
+        Neither tree is cached, so callers with their own trees (such as
+        landmark indexes) keep them out of the hub tree cache.
+        """
+        if self.free_flow is not None and mode not in TRAFFIC_MODES:
+            return self.free_flow.updated_tree(base_tree, mode)
+        tree = self._update(base_tree.root, mode, base_tree) if self.base_router is not None else None
+        return tree or self._solve(base_tree.root, mode)
+
+    def _update(self, root, mode, base_tree=None):
+        """
+        Dynamic-SSSP update of the base router's tree for an overlay.
+
+        Only valid when the overlay makes no edge more expensive (inserted
+        edges and shortcuts). Seeds every cheaper edge that improves its head
+        node, then runs Dijkstra over the improved region only; untouched
+        nodes keep their baseline distance and predecessor. Returns None when
+        a full solve is needed, including when the improved region outgrows
+        ``max_incremental`` nodes.
+        """
+        base = self.base_router
+        if self.cg.directed or mode in MULTIMODAL_MODES or getattr(self.cg, "base", None) is not base.cg:
+            return None
+        weights = self.weights(mode)
+        base_weights = base.weights(mode)
+        n_base = len(base_weights)
+        if np.any(weights[:n_base] > base_weights):
+            return None
+
+        if base_tree is None:
+            base_tree = base.tree(root, mode)
+        dist = base_tree.dist.copy()
+        pred = base_tree.pred.copy()
+        edge = base_tree.edge.copy()
+
+        # Overlay edges are the cheaper base edges plus everything appended
+        cheaper = np.flatnonzero(weights[:n_base] < base_weights)
+        delta = np.r_[cheaper, np.arange(n_base, len(weights))]
+        delta = delta[np.isfinite(weights[delta])]
+        sources = self.cg.edge_sources()
+        targets = np.asarray(self.cg.indices)
+        extra = {}
+        for e in delta[delta >= n_base].tolist():
+            extra.setdefault(int(sources[e]), []).append(e)
+
+        heap = []
+        for e in delta.tolist():
+            a, b = int(sources[e]), int(targets[e])
+            nd = dist[a] + weights[e]
+            if nd < dist[b]:
+                dist[b], pred[b], edge[b] = nd, a, e
+                heapq.heappush(heap, (nd, b))
+
+        indptr = np.asarray(base.cg.indptr)
+        changed = []
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            changed.append(u)
+            if len(changed) > self.max_incremental:
+                # The shortcut reshapes much of the tree; the C solver is faster
+                return None
+            out = np.arange(indptr[u], indptr[u + 1])
+            if u in extra:
+                out = np.r_[out, extra[u]]
+            nd = d + weights[out]
+            better = nd < dist[targets[out]]
+            for e, w in zip(out[better].tolist(), nd[better].tolist()):
+                v = int(targets[e])
+                if w < dist[v]:
+                    dist[v], pred[v], edge[v] = w, u, e
+                    heapq.heappush(heap, (w, v))
+
+        changed = np.unique(np.array(changed, dtype=np.int64))
+        return ShortestPathTree(self.cg, root, dist, pred, edge, changed=changed)
+
+    def forest(self, roots, mode="walk"):
+        """
+        One multi-source search from every root: each node's distance to its
+        nearest root, with ``source`` giving which root that is.
+        """
+        if self.free_flow is not None and mode not in TRAFFIC_MODES:
+            return self.free_flow.forest(roots, mode)
+        roots = tuple(sorted(set(np.atleast_1d(roots).tolist())))
+        key = (roots, mode)
+        if key not in self._trees:
+            rows = self.cg.index_of(list(roots))
+            dist, pred, edge, source = self.search(rows, mode, to_sources=True, min_only=True)
+            self._trees[key] = ShortestPathTree(
+                self.cg, roots, dist, pred, edge, source=source, node_rows=self.node_rows(mode)
+            )
+        return self._trees[key]
+
+    def search(self, rows, mode="walk", to_sources=False, limit=np.inf, min_only=False):
+        """
+        Batched Dijkstra from the node rows in ``rows``.
+
+        Returns dist, pred and the CSR edge behind each tree link, with one row
+        per source (or a single forest and each node's nearest source with
+        ``min_only``). With ``to_sources`` distances run from every node *to*
+        the sources, which only differs on directed graphs and multimodal
+        modes. ``limit`` stops each search at that routing cost. Multimodal
+        modes return one column per layered row (see ``node_rows``).
+        """
+        matrix, _ = self.matrix(mode)
+        transposed = to_sources and (self.cg.directed or mode in MULTIMODAL_MODES)
+        search = matrix.T.tocsr() if transposed else matrix
+        result = dijkstra(
+            search, directed=True, indices=rows, return_predecessors=True,
+            limit=limit, min_only=min_only
+        )
+        dist, pred = result[0], result[1]
+        edge = self._tree_edges(mode, pred, transposed)
+        if min_only:
+            return dist, pred, edge, result[2]
+        return dist, pred, edge
+
+    def _tree_edges(self, mode, pred, transposed):
+        # Recover which CSR edge each tree link uses (cheapest parallel edge)
+        matrix, entry_edges = self.matrix(mode)
+        n = matrix.shape[0]
+        if mode not in self._entry_keys:
+            coo = matrix.tocoo()
+            self._entry_keys[mode] = coo.row.astype(np.int64) * n + coo.col
+        flat = np.asarray(pred).ravel()
+        links = np.flatnonzero(flat >= 0)
+        nodes, parents = links % n, flat[links].astype(np.int64)
+        # A search over the transposed matrix follows edges node -> parent
+        src, dst = (nodes, parents) if transposed else (parents, nodes)
+        edge = np.full(flat.shape, -1, dtype=np.int64)
+        edge[links] = entry_edges[np.searchsorted(self._entry_keys[mode], src * n + dst)]
+        return edge.reshape(np.shape(pred))
+
+    def _solve(self, root, mode):
+        root_row = int(self.cg.index_of(root))
+        # Trees hold distances *to* the root
+        dist, pred, edge = self.search(root_row, mode, to_sources=True)
+        return ShortestPathTree(self.cg, root, dist, pred, edge, node_rows=self.node_rows(mode))
@@ -0,0 +1,180 @@
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+from datetime import datetime
+from transport_sim.population import AgentPopulation, MODES, ACTIVE
+from transport_sim.stats import StatsAggregator
+
+RUNS_DIR = "transport_sim/results/runs"
+# Runs kept by default; older ones are deleted as new ones are added
+KEEP_RUNS = 50
+
+# Per-agent columns stored for every population
+COLUMNS = ["id", "home_node", "mode", "status", "distance", "destination"]
+
+
+class RunStore:
+    """
+    Per-agent results of every run, kept side by side instead of overwritten.
+
+    Each run gets an ID and a directory holding one compressed columnar
+    ``.npz`` per population (baseline, tramline, ...): the COLUMNS arrays
+    plus, optionally, routes in CSR form (``route_offsets`` and int32
+    ``route_rows`` into the graph's ``node_ids``).
+    A run's files are written to a temporary directory that is renamed into
+    place only once complete; ``index.jsonl`` then gets one line with its
+    config and summary stats. Only the newest ``keep`` runs are kept (None
+    keeps all). Reads load only the columns asked for, since each .npz
+    member is decompressed on access.
+    """
+
+    def __init__(self, directory=RUNS_DIR, keep=KEEP_RUNS):
+        self.directory = directory
+        self.index_path = os.path.join(directory, "index.jsonl")
+        self.keep = keep
+
+    def new_run_id(self, config):
+        """Timestamp plus a hash of the config, e.g. 20250101-083000-1a2b3c."""
+        digest = hashlib.sha1(json.dumps(config, sort_keys=True, default=str).encode()).hexdigest()[:6]
+        run_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{digest}"
+        suffix, unique = 1, run_id
+        while os.path.exists(os.path.join(self.directory, unique)):
+            suffix += 1
+            unique = f"{run_id}-{suffix}"
+        return unique
+
+    def add_run(self, config, populations, routes=False, run_id=None):
+        """
+        Store ``populations`` ({name: AgentPopulation}) as one run.
+
+        Returns the run ID. With ``routes`` they are read off the routing
+        trees in one vectorised pass per population (routed populations only).
+        """
+        run_id = run_id or self.new_run_id(config)
+        run_dir = os.path.join(self.directory, run_id)
+        tmp_dir = os.path.join(self.directory, f".{run_id}.tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)  # left by an interrupted write
+        os.makedirs(tmp_dir)
+        try:
+            entry = self._write_run(tmp_dir, run_id, config, populations, routes)
+            os.replace(tmp_dir, run_dir)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        with open(self.index_path, "a") as f:
+            f.write(json.dumps(entry, default=str) + "\n")
+        print(f"📦 Saved run {run_id} ({', '.join(populations)}) to {run_dir}")
+        if self.keep is not None:
+            self.prune(self.keep)
+        return run_id
+
+    def _write_run(self, run_dir, run_id, config, populations, routes):
+        entry = {"run_id": run_id, "created": datetime.now().isoformat(timespec="seconds"),
+                 "config": config, "populations": {}}
+        for name, agents in populations.items():
+            arrays = {column: getattr(agents, column) for column in COLUMNS}
+            if routes and agents.router is not None:
+                arrays["route_offsets"], route_rows = agents.route_nodes(rows=True)
+                arrays["route_rows"] = route_rows.astype(np.int32)
+                arrays["node_ids"] = np.asarray(agents.router.cg.node_ids)
+            np.savez_compressed(os.path.join(run_dir, f"{name}.npz"), **arrays)
+            stats = agents.aggregate().to_dict()
+            entry["populations"][name] = {
+                "agents": len(agents),
+                "hub_node": None if agents.hub_node is None else int(agents.hub_node),
+                "routes": "route_rows" in arrays,
+                "avg_distance": stats["avg_distance"],
+                "unreachable": stats["unreachable"],
+            }
+        return entry
+
+    def delete_run(self, run_id):
+        """Remove a run's files and its index line."""
+        self._delete([run_id])
+
+    def prune(self, keep=KEEP_RUNS):
+        """Delete all but the newest ``keep`` runs; returns the deleted run IDs."""
+        runs = self.runs()
+        old = [run["run_id"] for run in runs[:max(len(runs) - keep, 0)]]
+        if old:
+            self._delete(old)
+        return old
+
+    def _delete(self, run_ids):
+        run_ids = set(run_ids)
+        kept = [run for run in self.runs() if run["run_id"] not in run_ids]
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.writelines(json.dumps(run, default=str) + "\n" for run in kept)
+        os.replace(tmp_path, self.index_path)
+        for run_id in run_ids:
+            shutil.rmtree(os.path.join(self.directory, run_id), ignore_errors=True)
+
+    def runs(self):
+        """Index entries of every stored run, oldest first."""
+        if not os.path.exists(self.index_path):
+            return []
+        with open(self.index_path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def get(self, run_id):
+        for run in self.runs():
+            if run["run_id"] == run_id:
+                return run
+        raise KeyError(f"Unknown run: {run_id}")
+
+    def load(self, run_id, name, columns=None):
+        """{column: array} of one stored population, reading only ``columns``."""
+        path = os.path.join(self.directory, run_id, f"{name}.npz")
+        if not os.path.exists(path):
+            raise KeyError(f"Run {run_id} has no population {name!r}")
+        with np.load(path) as data:
+            return {column: data[column] for column in (columns or data.files)}
+
+    def population(self, run_id, name):
+        """A stored population as an (unrouted) AgentPopulation."""
+        a = self.load(run_id, name, COLUMNS)
+        hub = self.get(run_id)["populations"][name]["hub_node"]
+        return AgentPopulation(a["home_node"], a["mode"], hub, ids=a["id"], status=a["status"],
+                               distance=a["distance"], destination=a["destination"])
+
+    def route(self, run_id, name, index):
+        """Node ids of one stored agent's route; KeyError if routes were not stored."""
+        a = self.load(run_id, name, ["route_offsets", "route_rows", "node_ids"])
+        rows = a["route_rows"][a["route_offsets"][index]:a["route_offsets"][index + 1]]
+        return a["node_ids"][rows].tolist()
+
+
+def compare_runs(store, run_a, run_b, name="tramline", name_b=None):
+    """
+    Per-mode comparison of one population in two stored runs.
+
+    Returns {"modes": {mode: {"a": stats, "b": stats, "delta_avg_distance":
+    a - b}}} with each side's per-mode compute_stats summary, plus
+    "changed_agents" when both runs hold the same agents (same ids and
+    homes, e.g. one seed). Only the columns needed are read.
+    """
+    columns = ["id", "home_node", "mode", "status", "distance"]
+    a = store.load(run_a, name, columns)
+    b = store.load(run_b, name_b or name, columns)
+    modes = []
+    for side in (a, b):
+        stats = StatsAggregator(MODES).add(side["mode"], side["status"] == ACTIVE, side["distance"]).to_dict()
+        modes.append(stats["modes"])
+
+    result = {"modes": {}}
+    for mode in sorted(set(modes[0]) | set(modes[1]), key=MODES.index):
+        sa, sb = modes[0].get(mode, {}), modes[1].get(mode, {})
+        avg_a, avg_b = sa.get("avg_distance"), sb.get("avg_distance")
+        result["modes"][mode] = {
+            "a": sa, "b": sb,
+            "delta_avg_distance": avg_a - avg_b if avg_a is not None and avg_b is not None else None,
+        }
+    if np.array_equal(a["id"], b["id"]) and np.array_equal(a["home_node"], b["home_node"]):
+        result["changed_agents"] = int((
+            (a["mode"] != b["mode"]) | (a["status"] != b["status"])
+            | ~np.isclose(a["distance"], b["distance"], rtol=0, atol=1e-9)
+        ).sum())
+    return result
@@ -0,0 +1,136 @@
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory, resource_tracker
+from transport_sim.graph_cache import CompiledGraph
+from transport_sim.routing import RoutingEngine, ShortestPathTree
+
+_GRAPH_ARRAYS = ["node_ids", "x", "y", "indptr", "indices", "length", "highway", "speed_kph", "tram"]
+_TREE_ARRAYS = ["dist", "pred", "edge", "length"]
+
+
+class SharedArrays:
+    """
+    A set of NumPy arrays packed into one shared-memory block.
+
+    The owning process creates it from a dict of arrays and passes ``spec``
+    (a small picklable description) to workers, which call ``attach`` to get
+    zero-copy read-only views. The owner must call ``close`` when done.
+    """
+
+    def __init__(self, arrays):
+        layout, offset = [], 0
+        for name, arr in arrays.items():
+            arr = np.ascontiguousarray(arr)
+            offset = -(-offset // 64) * 64  # keep every array cache-line aligned
+            layout.append((name, arr.dtype.str, arr.shape, offset))
+            offset += arr.nbytes
+
+        self._shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for (name, dtype, shape, start), arr in zip(layout, arrays.values()):
+            view = np.ndarray(shape, dtype=dtype, buffer=self._shm.buf, offset=start)
+            view[...] = arr
+        self.spec = (self._shm.name, layout)
+
+    def close(self):
+        self._shm.close()
+        self._shm.unlink()
+
+
+_attached = []
+
+def _open_untracked(name):
+    # Only the owner may unlink the block, so attaching processes must not
+    # register it with a resource tracker (track=False exists from 3.13)
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        register = resource_tracker.register
+        resource_tracker.register = lambda *args, **kwargs: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+def attach(spec):
+    """
+    Read-only views onto a SharedArrays block created by another process.
+
+    For pool workers only: the mapping is kept for the life of the process.
+    """
+    name, layout = spec
+    shm = _open_untracked(name)
+    _attached.append(shm)  # keep the mapping alive for the life of the worker
+
+    arrays = {}
+    for key, dtype, shape, start in layout:
+        view = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=start)
+        view.flags.writeable = False
+        arrays[key] = view
+    return arrays
+
+
+def share_router(router, trees=()):
+    """
+    Pack a router's graph and the given (root, mode) trees into shared memory.
+
+    Returns the SharedArrays block plus the metadata workers need to rebuild
+    the router with ``attach_router``.
+    """
+    cg = router.cg
+    arrays = {f"graph.{name}": np.asarray(getattr(cg, name)) for name in _GRAPH_ARRAYS}
+    for i, (root, mode) in enumerate(trees):
+        tree = router.tree(root, mode)
+        for name in _TREE_ARRAYS:
+            arrays[f"tree{i}.{name}"] = getattr(tree, name)
+    block = SharedArrays(arrays)
+    meta = {
+        "highway_classes": cg.highway_classes,
+        "directed": cg.directed,
+        "trees": list(trees),
+        "traffic": router.traffic,
+    }
+    return block, meta
+
+
+def attach_router(spec, meta):
+    """Rebuild a RoutingEngine whose graph and baseline trees live in shared memory."""
+    arrays = attach(spec)
+    cg = CompiledGraph(
+        highway_classes=meta["highway_classes"],
+        directed=meta["directed"],
+        **{name: arrays[f"graph.{name}"] for name in _GRAPH_ARRAYS}
+    )
+    router = RoutingEngine(cg, traffic=meta.get("traffic"))
+    for i, (root, mode) in enumerate(meta["trees"]):
+        tree = ShortestPathTree(
+            cg, root, node_rows=router.node_rows(mode),
+            **{name: arrays[f"tree{i}.{name}"] for name in _TREE_ARRAYS}
+        )
+        router.add_tree(tree, mode)
+    return router, arrays
+
+
+def run_jobs(fn, jobs, state, setup, setup_args, initializer, share, processes=None, chunksize=1):
+    """
+    Map ``fn`` over ``jobs`` with per-process worker ``state`` (a dict ``fn`` reads).
+
+    With ``processes == 1`` the jobs run in this process: ``setup(*setup_args)``
+    fills ``state`` from the caller's own router and arrays, so nothing is
+    placed in or attached from shared memory. Otherwise ``share()`` packs
+    what the workers need and returns (initargs, blocks); every worker runs
+    ``initializer(*initargs)`` once and the blocks are closed afterwards.
+    ``state`` is cleared either way.
+    """
+    blocks = []
+    try:
+        if processes == 1:
+            setup(*setup_args)
+            return [fn(job) for job in jobs]
+        initargs, blocks = share()
+        with ProcessPoolExecutor(processes, initializer=initializer, initargs=initargs) as pool:
+            return list(pool.map(fn, jobs, chunksize=chunksize))
+    finally:
+        state.clear()
+        for block in blocks:
+            block.close()
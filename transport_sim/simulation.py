@@ -1,70 +1,29 @@
 import json
-import random
-import networkx as nx
-from transport_sim.agent import Agent
+import numpy as np
 from transport_sim.city_loader import tram_coords_lookup
-from collections import defaultdict
-import osmnx as ox
+from transport_sim.overlay import add_tramline
+from transport_sim.routing import RoutingEngine
+from transport_sim.spatial_index import nearest_nodes
+from transport_sim.population import AgentPopulation, MODES, mode_probabilities, synthesize_population
+from transport_sim.stats import StatsAggregator
+from transport_sim.assignment import assign_traffic
+
+def aggregate_stats(agents):
+    """A mergeable StatsAggregator over an AgentPopulation or a list of Agents."""
+    if isinstance(agents, AgentPopulation):
+        return agents.aggregate()
+    modes = np.array([MODES.index(a.mode) for a in agents], dtype=np.intp)
+    reachable = np.array([a.status != "unreachable" for a in agents], dtype=bool)
+    distance = np.array([a.total_distance if a.status != "unreachable" else 0.0 for a in agents])
+    return StatsAggregator(MODES).add(modes, reachable, distance)
 
 def compute_stats(agents):
-    stats = {
-        "total_agents": len(agents),
-        "unreachable": 0,
-        "avg_distance": 0,
-        "min_distance": float("inf"),
-        "max_distance": 0,
-        "modes": defaultdict(lambda: {
-            "count": 0,
-            "reachable_count": 0,
-            "unreachable": 0,
-            "total_distance": 0,
-            "min_distance": float("inf"),
-            "max_distance": 0,
-            "avg_distance": None
-        })
-    }
-
-    total_reachable = 0
-
-    for agent in agents:
-        mode = agent.mode
-        mode_stats = stats["modes"][mode]
-        mode_stats["count"] += 1
-
-        if agent.status == 'unreachable':
-            stats["unreachable"] += 1
-            mode_stats["unreachable"] += 1
-            continue
-
-        # Reachable agent
-        dist = agent.total_distance
-        stats["avg_distance"] += dist
-        stats["min_distance"] = min(stats["min_distance"], dist)
-        stats["max_distance"] = max(stats["max_distance"], dist)
-        total_reachable += 1
-
-        mode_stats["reachable_count"] += 1
-        mode_stats["total_distance"] += dist
-        mode_stats["min_distance"] = min(mode_stats["min_distance"], dist)
-        mode_stats["max_distance"] = max(mode_stats["max_distance"], dist)
-
-    # Final averages
-    if total_reachable > 0:
-        stats["avg_distance"] /= total_reachable
-    else:
-        stats["avg_distance"] = None
-        stats["min_distance"] = None
-        stats["max_distance"] = None
-
-    for mode, m in stats["modes"].items():
-        if m["reachable_count"] > 0:
-            m["avg_distance"] = m["total_distance"] / m["reachable_count"]
-        else:
-            m["avg_distance"] = None
-            m["min_distance"] = None
-            m["max_distance"] = None
-
-    return stats
+    if isinstance(agents, AgentPopulation):
+        return agents.stats()
+    return aggregate_stats(agents).to_dict()
+
+def group_stats_by_mode(agents):
+    return aggregate_stats(agents).by_mode()
 
 def load_config(path="transport_sim/config.json"):
     """Load simulation parameters from JSON config."""
@@ -78,75 +37,73 @@ def apply_scenario(graph, scenario):
     if not stops or len(stops) < 2:
         return None, None
 
-    for i in range(len(stops) - 1):
-        s1, s2 = stops[i], stops[i+1]
-
-        if s1 in tram_coords_lookup and s2 in tram_coords_lookup:
-            lat1, lon1 = tram_coords_lookup[s1]
-            lat2, lon2 = tram_coords_lookup[s2]
-            n1 = ox.distance.nearest_nodes(graph, lon1, lat1)
-            n2 = ox.distance.nearest_nodes(graph, lon2, lat2)
-
-            graph.add_edge(n1, n2, length=length, tram=True)
-            graph.add_edge(n2, n1, length=length, tram=True)
-
-    return None, None
-
+    # Snap every known stop in one batched query
+    known = [s for s in stops if s in tram_coords_lookup]
+    stop_nodes = {}
+    if known:
+        lats, lons = zip(*(tram_coords_lookup[s] for s in known))
+        stop_nodes = dict(zip(known, nearest_nodes(graph, list(lons), list(lats)).tolist()))
 
-def run_abm(graph, hub, num_agents, agent_distribution):
-    agents = []
+    add_tramline(graph, [stop_nodes.get(s) for s in stops], length)
 
-    mode_choices = ["drive", "cycle", "walk", "tram"]
-    mode_weights = [
-        agent_distribution.get("drive", 0),
-        agent_distribution.get("cycle", 0),
-        agent_distribution.get("walk", 0),
-        agent_distribution.get("tram", 0),
-    ]
+    if not known:
+        return None, None
+    # End nodes of the line, for reporting
+    return stop_nodes[known[0]], stop_nodes[known[-1]]
 
-    # Normalize weights (in case they don’t sum to 100)
-    total = sum(mode_weights)
-    if total == 0:
-        raise ValueError("Agent distribution weights cannot all be zero.")
-    mode_weights = [w / total for w in mode_weights]
 
+def tram_spawn_nodes(graph):
+    """Graph nodes of the tram stops tram agents spawn at (empty if unresolved)."""
     # Try to get real node IDs for tram stops
     tram_nodes = []
     if "Bournemouth Pier" in tram_coords_lookup and "Lansdowne" in tram_coords_lookup:
         lat1, lon1 = tram_coords_lookup["Bournemouth Pier"]
         lat2, lon2 = tram_coords_lookup["Lansdowne"]
         try:
-            n1 = ox.distance.nearest_nodes(graph, lon1, lat1)
-            n2 = ox.distance.nearest_nodes(graph, lon2, lat2)
-            tram_nodes = [n1, n2]
+            tram_nodes = nearest_nodes(graph, [lon1, lon2], [lat1, lat2]).tolist()
         except Exception as e:
             print("⚠️ Could not resolve tram stop nodes:", e)
-
-    for i in range(num_agents):
-        mode = random.choices(mode_choices, weights=mode_weights, k=1)[0]
-
-        if mode == "tram" and tram_nodes:
-            # Spawn tram agents on or near tramline stops
-            home_node = random.choice(tram_nodes)
-        else:
-            home_node = random.choice(list(graph.nodes))
-
-        agent = Agent(
-            id=i,
-            home_node=home_node,
-            graph=graph,
-            hub_node=hub,
-            mode=mode
-        )
-        agent.plan_route()
-        agents.append(agent)
+    return tram_nodes
+
+
+def draw_population(graph, hub, num_agents, agent_distribution, router=None, seed=None, spawn_weights=None):
+    """Synthesise run_abm's agents without routing them."""
+    router = router or RoutingEngine(graph)
+
+    # Fail early on an empty distribution, before any snapping work
+    mode_probabilities(agent_distribution)
+
+    return synthesize_population(
+        router.cg.node_ids, hub, num_agents, agent_distribution,
+        rng=seed, spawn_weights=spawn_weights, tram_nodes=tram_spawn_nodes(graph)
+    )
+
+
+def run_abm(graph, hub, num_agents, agent_distribution, router=None, seed=None, spawn_weights=None,
+            destinations=None, designated=None, congestion=None):
+    """
+    Draw and route agents, returning (stats, agents).
+
+    Agents head for the hub by default. With ``destinations`` (node ids) each
+    agent goes to the nearest one by its mode; ``designated`` gives one
+    destination node per agent instead. With ``congestion`` (True or a dict
+    of assign_traffic options) drivers are routed on costs from an iterative
+    traffic assignment of their own demand.
+    """
+    # One shortest-path tree per destination and mode answers every agent
+    router = router or RoutingEngine(graph)
+
+    agents = draw_population(
+        graph, hub, num_agents, agent_distribution,
+        router=router, seed=seed, spawn_weights=spawn_weights
+    )
+    if designated is not None:
+        if len(designated) != num_agents:
+            raise ValueError("designated must give one destination per agent.")
+        agents.destination = np.asarray(designated, dtype=np.int64)
+    if congestion:
+        options = congestion if isinstance(congestion, dict) else {}
+        router = assign_traffic(router, agents, destinations=destinations, **options)["router"]
+    agents.plan_routes(router, destinations=destinations)
 
     return compute_stats(agents), agents
-
-
-def adjust_for_traffic(G, traffic_level):
-    if traffic_level == "rush hour":
-        for u, v, data in G.edges(data=True):
-            if "highway" in data.get("tags", {}):  # optional check
-                data["length"] *= 1.5  # roads become "longer" (slower)
-    return G
\ No newline at end of file
@@ -0,0 +1,99 @@
+import numpy as np
+from scipy.spatial import cKDTree
+from transport_sim.graph_cache import CompiledGraph, attached_index
+from transport_sim.overlay import ScenarioOverlay
+
+EARTH_RADIUS_M = 6_371_009
+
+
+def _unit_vectors(lat, lon):
+    # Points on the unit sphere: chord length is monotonic in great-circle
+    # distance, so Euclidean nearest neighbours are geodesic nearest neighbours
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def _chord_to_metres(chord):
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.clip(chord / 2, 0, 1))
+
+
+def _metres_to_chord(metres):
+    return 2 * np.sin(np.asarray(metres, dtype=np.float64) / (2 * EARTH_RADIUS_M))
+
+
+class SpatialIndex:
+    """
+    KD-tree over graph node coordinates for lat/lon -> node snapping.
+
+    Every query is batched: pass scalars or arrays of lat/lon. Distances are
+    great-circle metres.
+    """
+
+    def __init__(self, node_ids, lat, lon):
+        self.node_ids = np.asarray(node_ids, dtype=np.int64)
+        ok = np.isfinite(lat) & np.isfinite(lon)
+        self._rows = np.flatnonzero(ok)
+        self._tree = cKDTree(_unit_vectors(np.asarray(lat)[ok], np.asarray(lon)[ok]))
+
+    @classmethod
+    def from_compiled(cls, cg):
+        return cls(np.asarray(cg.node_ids), np.asarray(cg.y), np.asarray(cg.x))
+
+    @classmethod
+    def from_networkx(cls, G):
+        nodes = list(G.nodes)
+        lat = np.array([G.nodes[n].get("y", np.nan) for n in nodes], dtype=np.float64)
+        lon = np.array([G.nodes[n].get("x", np.nan) for n in nodes], dtype=np.float64)
+        return cls(nodes, lat, lon)
+
+    def nearest(self, lat, lon, return_dist=False):
+        """Nearest node id for each point (scalar in, scalar out)."""
+        chord, i = self._tree.query(_unit_vectors(lat, lon))
+        nodes = self.node_ids[self._rows[i]]
+        if np.ndim(nodes) == 0:
+            nodes = int(nodes)
+        if return_dist:
+            return nodes, _chord_to_metres(chord)
+        return nodes
+
+    def k_nearest(self, lat, lon, k, return_dist=False):
+        """The ``k`` nearest node ids for each point, closest first."""
+        chord, i = self._tree.query(_unit_vectors(lat, lon), k=k)
+        nodes = self.node_ids[self._rows[i]]
+        if return_dist:
+            return nodes, _chord_to_metres(chord)
+        return nodes
+
+    def within(self, lat, lon, radius_m):
+        """Node ids within ``radius_m`` metres of each point (one array per point)."""
+        points = _unit_vectors(lat, lon)
+        hits = self._tree.query_ball_point(points, _metres_to_chord(radius_m))
+        if points.ndim == 1:
+            return self.node_ids[self._rows[hits]]
+        return [self.node_ids[self._rows[h]] for h in hits]
+
+
+def spatial_index(graph):
+    """
+    Return the SpatialIndex attached to a graph, building it only once.
+
+    For a CompiledGraph loaded from the cache the index is persisted next to
+    the graph arrays, and scenario overlays use their base graph's index.
+    NetworkX graphs keep it in ``G.graph``; copies made with ``G.copy()``
+    share it, which is safe as long as no nodes are added.
+    """
+    if isinstance(graph, ScenarioOverlay):
+        # Overlays never add nodes, so they share their base graph's index
+        graph = graph.base
+    if isinstance(graph, CompiledGraph):
+        return attached_index(graph, "spatial_index", SpatialIndex.from_compiled)
+    if "spatial_index" not in graph.graph:
+        graph.graph["spatial_index"] = SpatialIndex.from_networkx(graph)
+    return graph.graph["spatial_index"]
+
+
+def nearest_nodes(graph, X, Y):
+    """Drop-in for ox.distance.nearest_nodes(G, X, Y) backed by the cached index."""
+    return spatial_index(graph).nearest(Y, X)
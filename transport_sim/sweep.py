@@ -0,0 +1,156 @@
+import os
+import csv
+import itertools
+import numpy as np
+from transport_sim.city_loader import tram_coords_lookup
+from transport_sim.overlay import ScenarioOverlay, add_tramline
+from transport_sim.population import AgentPopulation, MODES
+from transport_sim.routing import RoutingEngine
+from transport_sim.shared import SharedArrays, attach, share_router, attach_router, run_jobs
+from transport_sim.spatial_index import spatial_index
+
+
+def tramline_candidates(stops, length=300, max_stops=2):
+    """Every ordered line of 2..max_stops distinct stops, as tramline_extension scenarios."""
+    candidates = []
+    for r in range(2, max_stops + 1):
+        for line in itertools.permutations(stops, r):
+            candidates.append({"tram_stops": list(line), "length": length})
+    return candidates
+
+
+def city_stops(graph, max_snap_m=2000):
+    """Names in tram_coords_lookup that snap to ``graph`` within ``max_snap_m`` metres."""
+    names = list(tram_coords_lookup)
+    lats, lons = zip(*(tram_coords_lookup[n] for n in names))
+    _, dist = spatial_index(graph).nearest(np.array(lats), np.array(lons), return_dist=True)
+    return [n for n, d in zip(names, dist.tolist()) if d <= max_snap_m]
+
+
+# --- Worker side: state set up once per process by _setup ---
+
+_worker = {}
+
+def _baseline(router, agents, hub):
+    # Baseline outcomes come straight off the hub trees
+    baseline = AgentPopulation(agents["home_node"], agents["mode"].copy(), hub)
+    baseline.plan_routes(router)
+    return baseline
+
+
+def _setup(router, agents, hub, baseline=None):
+    baseline = baseline if baseline is not None else _baseline(router, agents, hub)
+    _worker.update(router=router, agents=agents, baseline=baseline, hub=hub)
+
+
+def _init_worker(router_spec, router_meta, agents_spec, hub):
+    router, _ = attach_router(router_spec, router_meta)
+    _setup(router, attach(agents_spec), hub)
+
+
+def _evaluate(job):
+    index, stop_nodes, length = job
+    router = _worker["router"]
+    overlay = ScenarioOverlay(router.cg)
+    add_tramline(overlay, stop_nodes, length)
+
+    drawn = _worker["agents"]
+    agents = AgentPopulation(drawn["home_node"], drawn["mode"].copy(), _worker["hub"])
+    agents.plan_routes(RoutingEngine(overlay, base_router=router))
+    changed = int(agents.changed_from(_worker["baseline"]).sum())
+    return index, agents.stats(), changed
+
+
+def sweep_tramlines(router, hub, agents, candidates, processes=None):
+    """
+    Evaluate tramline_extension candidates in parallel and rank them by gain.
+
+    ``agents`` is an unrouted AgentPopulation (as drawn by draw_population);
+    every candidate is evaluated on the same agents so differences are due
+    to the line alone. The base graph, the baseline trees from the hub and
+    the agent arrays are placed in shared memory once; each worker routes
+    its candidates as incremental updates of those trees. With
+    ``processes == 1`` the candidates run in this process on ``router`` itself.
+    """
+    # Snap every stop used by any candidate in one batched query
+    names = sorted({s for c in candidates for s in c["tram_stops"] if s in tram_coords_lookup})
+    lats, lons = zip(*(tram_coords_lookup[n] for n in names)) if names else ((), ())
+    snapped = dict(zip(names, spatial_index(router.cg).nearest(np.array(lats), np.array(lons)).tolist()))
+
+    jobs = []
+    for i, c in enumerate(candidates):
+        nodes = [snapped.get(s) for s in c["tram_stops"]]
+        jobs.append((i, nodes, c.get("length", 300)))
+
+    drawn = {"home_node": agents.home_node, "mode": agents.mode}
+    baseline = _baseline(router, drawn, hub)
+
+    def share():
+        router_block, router_meta = share_router(router, [(hub, m) for m in MODES])
+        agents_block = SharedArrays(drawn)
+        return (router_block.spec, router_meta, agents_block.spec, hub), [router_block, agents_block]
+
+    results = run_jobs(
+        _evaluate, jobs, _worker, _setup, (router, drawn, hub, baseline), _init_worker, share,
+        processes=processes, chunksize=max(1, len(jobs) // 32)
+    )
+    baseline_stats = baseline.stats()
+
+    rows = []
+    for index, stats, changed in results:
+        c = candidates[index]
+        row = {
+            "tram_stops": " → ".join(c["tram_stops"]),
+            "n_stops": len(c["tram_stops"]),
+            "length": c.get("length", 300),
+            "avg_distance": stats["avg_distance"],
+            "gain": _gain(baseline_stats["avg_distance"], stats["avg_distance"]),
+            "unreachable": stats["unreachable"],
+            "changed_agents": changed,
+        }
+        for mode in MODES:
+            base = baseline_stats["modes"].get(mode, {}).get("avg_distance")
+            new = stats["modes"].get(mode, {}).get("avg_distance")
+            row[f"{mode}_gain"] = _gain(base, new)
+        rows.append(row)
+
+    rows.sort(key=lambda r: r["gain"] if r["gain"] is not None else float("-inf"), reverse=True)
+    for rank, row in enumerate(rows, start=1):
+        row["rank"] = rank
+    return rows
+
+
+def _gain(before, after):
+    if before is None or after is None:
+        return None
+    return before - after
+
+
+def save_sweep(rows, path):
+    """Write the ranked table as CSV."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fields = ["rank", "tram_stops", "n_stops", "length", "gain", "avg_distance", "unreachable",
+              "changed_agents"] + [f"{m}_gain" for m in MODES]
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+
+if __name__ == "__main__":
+    import sys
+    import argparse
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+    from transport_sim.simulation import load_config
+    from transport_sim.engine import get_engine
+
+    parser = argparse.ArgumentParser(description="Rank every tramline candidate for a config's city.")
+    parser.add_argument("config", nargs="?", default="transport_sim/config.json")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--max-stops", type=int, default=2)
+    args = parser.parse_args()
+
+    rows = get_engine().sweep(load_config(args.config), processes=args.processes, max_stops=args.max_stops)
+    for row in rows[:10]:
+        print(f"{row['rank']:>3}. {row['tram_stops']:<45} gain {row['gain'] or 0:8.1f} m")
@@ -0,0 +1,129 @@
+import json
+import numpy as np
+from datetime import date, datetime
+
+HOURS = 24
+
+# Weekday peaks 07:00-09:59 and 16:00-18:59; weekends only see a midday bump
+_PEAK = [1.0] * 7 + [1.5] * 3 + [1.0] * 6 + [1.5] * 3 + [1.0] * 5
+_SHOULDER = [1.0] * 7 + [1.3] * 3 + [1.0] * 6 + [1.3] * 3 + [1.0] * 5
+_WEEKEND = [1.0] * 10 + [1.2] * 6 + [1.0] * 8
+
+# Per-road-class hourly multipliers on driving cost; classes not listed keep 1.0
+DEFAULT_PROFILE = {
+    "weekday": {
+        "motorway": _PEAK, "trunk": _PEAK, "primary": _PEAK, "secondary": _PEAK,
+        "motorway_link": _PEAK, "trunk_link": _PEAK, "primary_link": _PEAK,
+        "tertiary": _SHOULDER, "residential": _SHOULDER, "unclassified": _SHOULDER,
+    },
+    "weekend": {
+        "motorway": _WEEKEND, "trunk": _WEEKEND, "primary": _WEEKEND, "secondary": _WEEKEND,
+        "tertiary": _WEEKEND,
+    },
+}
+
+# Named traffic levels from the configs, as a representative hour of the day
+LEVEL_HOURS = {"off-peak": 11, "peak": 8, "rush hour": 8}
+
+
+class TrafficProfile:
+    """
+    Time-of-day congestion as per-road-class, per-hour multiplier tables.
+
+    A profile never touches the graph: ``multipliers`` gathers one factor per
+    edge from the table row of each edge's highway class, and the routing
+    engine scales its driving costs by that vector. Every hour of every day
+    type can be evaluated against one loaded graph.
+    """
+
+    def __init__(self, tables=None):
+        tables = DEFAULT_PROFILE if tables is None else tables
+        self.day_types = list(tables)
+        self.classes = [""] + sorted({c for t in tables.values() for c in t})
+        # (day type, class, hour); row 0 is the "unknown class" row of 1.0s
+        self.table = np.ones((len(self.day_types), len(self.classes), HOURS))
+        for d, day in enumerate(self.day_types):
+            for name, hours in tables[day].items():
+                if len(hours) != HOURS:
+                    raise ValueError(f"Traffic profile for {day}/{name} needs {HOURS} hourly values.")
+                self.table[d, self.classes.index(name)] = hours
+        self._codes = {}
+
+    @classmethod
+    def from_json(cls, path):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def day_type(self, sim_date=None):
+        """'weekend' for Saturdays and Sundays when the profile has one, else 'weekday'."""
+        if sim_date is None:
+            return self.day_types[0]
+        if isinstance(sim_date, str):
+            sim_date = date.fromisoformat(sim_date)
+        if sim_date.weekday() >= 5 and "weekend" in self.day_types:
+            return "weekend"
+        return "weekday" if "weekday" in self.day_types else self.day_types[0]
+
+    def class_codes(self, cg):
+        """Profile row for each of the graph's highway class codes."""
+        key = tuple(cg.highway_classes)
+        if key not in self._codes:
+            rows = {name: i for i, name in enumerate(self.classes)}
+            self._codes[key] = np.array([rows.get(name, 0) for name in cg.highway_classes], dtype=np.intp)
+        return self._codes[key]
+
+    def at(self, hour, day_type="weekday"):
+        """This profile at one hour, as passed to RoutingEngine(traffic=...)."""
+        return TrafficTime(self, hour, day_type)
+
+    def multipliers(self, cg, hour, day_type="weekday"):
+        """Per-edge cost multipliers at ``hour`` (0-23), one gather over class codes."""
+        by_code = self.table[self.day_types.index(day_type), :, hour][self.class_codes(cg)]
+        return by_code[np.asarray(cg.highway)]
+
+    def all_hours(self, cg, day_type="weekday"):
+        """Multipliers for every hour at once, shape (24, n_edges)."""
+        by_code = self.table[self.day_types.index(day_type)][self.class_codes(cg)]
+        return by_code[np.asarray(cg.highway)].T
+
+
+class TrafficTime:
+    """A profile fixed at one hour and day type."""
+
+    def __init__(self, profile, hour, day_type="weekday"):
+        self.profile = profile
+        self.hour = hour
+        self.day_type = day_type
+
+    @property
+    def key(self):
+        return (self.day_type, self.hour)
+
+    def multipliers(self, cg):
+        return self.profile.multipliers(cg, self.hour, self.day_type)
+
+    def is_free_flow(self):
+        """True when no road class is slowed at this time."""
+        return bool(np.all(self.profile.table[self.profile.day_types.index(self.day_type), :, self.hour] == 1))
+
+
+DEFAULT_TRAFFIC = TrafficProfile()
+
+
+def traffic_for(config, profile=None):
+    """
+    The TrafficTime a config asks for.
+
+    A named ``traffic`` level ("off-peak", "peak", "rush hour") picks its
+    representative hour; otherwise ``sim_time`` is used. ``sim_date``
+    decides weekday or weekend.
+    """
+    profile = profile or DEFAULT_TRAFFIC
+    level = config.get("traffic")
+    if level in LEVEL_HOURS:
+        hour = LEVEL_HOURS[level]
+    elif config.get("sim_time"):
+        hour = datetime.strptime(config["sim_time"], "%H:%M").hour
+    else:
+        hour = LEVEL_HOURS["off-peak"]
+    return profile.at(hour, profile.day_type(config.get("sim_date")))